@@ -0,0 +1,35 @@
+"""
+Typedefs and model helpers shared by the benchmark scripts.
+
+Importing this module also puts the repository root on ``sys.path``, so the
+scripts run against the checkout without installing declare.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from declare import Field, ModelMetaclass, TypeDefinition  # noqa: E402
+
+
+class Integer(TypeDefinition):
+    python_type = int
+    backing_type = str
+
+    def _load(self, value, **kwargs):
+        return int(value)
+
+    def _dump(self, value, **kwargs):
+        return str(value)
+
+
+def make_model(n_fields, typedefs=(Integer,), **meta):
+    """
+    Create a model with fields f0..fN, cycling through ``typedefs``.
+    ``meta`` becomes the model's Meta attributes.
+    """
+    attrs = {"f{}".format(i): Field(typedef=typedefs[i % len(typedefs)])
+             for i in range(n_fields)}
+    attrs["Meta"] = type("Meta", (), meta)
+    return ModelMetaclass("Model", (), attrs)
@@ -0,0 +1,54 @@
+"""
+Compare generated model load/dump against a per-field engine loop.
+
+    python benchmarks/compiled_models.py [--fields N] [--number N]
+"""
+import argparse
+import timeit
+
+from common import make_model
+from declare import TypeEngine
+
+
+def loop_load(engine, model, wire):
+    obj = model.__new__(model)
+    for name, field in model.Meta.fields_by_model_name.items():
+        setattr(obj, name, engine.load(field.typedef, wire[name]))
+    return obj
+
+
+def loop_dump(engine, model, obj):
+    wire = {}
+    for name, field in model.Meta.fields_by_model_name.items():
+        wire[name] = engine.dump(field.typedef, getattr(obj, name))
+    return wire
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    model = make_model(args.fields)
+    engine = TypeEngine.unique()
+    engine.register(model)
+    engine.bind()
+    wire = {field.model_name: "1" for field in model.Meta.fields}
+    obj = engine.load(model, wire)
+    assert loop_dump(engine, model, obj) == engine.dump(model, obj)
+
+    cases = [
+        ("per-field load", lambda: loop_load(engine, model, wire)),
+        ("compiled load", lambda: engine.load(model, wire)),
+        ("per-field dump", lambda: loop_dump(engine, model, obj)),
+        ("compiled dump", lambda: engine.dump(model, obj)),
+    ]
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=args.number, repeat=5))
+        print("{:<16} {:8.3f} us/model".format(
+            name, best / args.number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
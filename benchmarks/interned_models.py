@@ -0,0 +1,59 @@
+"""
+Compare memory and load time of models with and without interned
+enum-like fields.
+
+    python benchmarks/interned_models.py [--records N]
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+
+from declare import Field, ModelMetaclass, TypeDefinition, TypeEngine
+
+
+class Name(TypeDefinition):
+    python_type = str
+    backing_type = str
+
+    def __init__(self, intern):
+        self.intern = intern
+
+    def _load(self, value, **kwargs):
+        return value.title()
+
+
+def make_model(intern):
+    attrs = {name: Field(typedef=Name(intern))
+             for name in ("kind", "region", "status", "owner")}
+    return ModelMetaclass("Model", (), attrs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    record = {"kind": "stone block", "region": "north west",
+              "status": "placed by player", "owner": "server admin"}
+    payload = json.dumps([record] * args.records)
+    for intern in (False, True):
+        model = make_model(intern)
+        engine = TypeEngine.unique()
+        engine.register(model)
+        engine.bind()
+        wires = json.loads(payload)
+        elapsed = min(timeit.repeat(lambda: engine.load_many(model, wires),
+                                    number=1, repeat=3))
+        # Measured separately, since tracing slows every allocation down
+        tracemalloc.start()
+        objs = engine.load_many(model, wires)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("intern={!s:<5} {:8.1f} ms {:8.1f} MiB".format(
+            intern, elapsed * 1e3, size / 2 ** 20))
+        del objs
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Compare eager and Meta.lazy model loads when only a few fields are read.
+
+    python benchmarks/lazy_models.py [--fields N] [--reads N]
+"""
+import argparse
+import timeit
+
+from common import make_model
+from declare import TypeEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--fields", type=int, default=40)
+    parser.add_argument("--reads", type=int, default=3)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    engine = TypeEngine.unique()
+    wire = {"f{}".format(i): str(i) for i in range(args.fields)}
+    names = ["f{}".format(i) for i in range(args.reads)]
+    for lazy in (False, True):
+        model = make_model(args.fields, lazy=lazy)
+        engine.register(model)
+        engine.bind()
+
+        def load_and_read():
+            obj = engine.load(model, wire)
+            for name in names:
+                getattr(obj, name)
+
+        best = min(timeit.repeat(load_and_read, number=args.number, repeat=5))
+        print("lazy={!s:<5} {:8.3f} us/model".format(
+            lazy, best / args.number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Time importing a module that defines many models, with and without
+Meta.deferred.
+
+    python benchmarks/model_startup.py [--models N] [--fields M]
+"""
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+import common  # noqa: F401 (puts the checkout on sys.path)
+
+
+def module_source(n_models, n_fields, deferred):
+    lines = ["from declare import Field, ModelMetaclass, TypeDefinition", ""]
+    for i in range(n_models):
+        lines.append("class Model{}(metaclass=ModelMetaclass):".format(i))
+        for j in range(n_fields):
+            lines.append("    f{} = Field(typedef=TypeDefinition)".format(j))
+        lines.append("")
+        lines.append("    class Meta:")
+        lines.append("        deferred = {}".format(deferred))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def time_import(name, repeat):
+    best = None
+    for _ in range(repeat):
+        sys.modules.pop(name, None)
+        start = time.perf_counter()
+        importlib.import_module(name)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--models", type=int, default=1000)
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sys.path.insert(0, directory)
+        for deferred in (False, True):
+            name = "startup_models_{}".format(deferred).lower()
+            path = os.path.join(directory, name + ".py")
+            with open(path, "w") as f:
+                f.write(module_source(args.models, args.fields, deferred))
+            # Compile once so every timed import loads cached bytecode
+            importlib.import_module(name)
+            best = time_import(name, args.repeat)
+            print("deferred={!s:<5} {:8.2f} ms for {} models x {} fields"
+                  .format(deferred, best * 1e3, args.models, args.fields))
+
+
+if __name__ == "__main__":
+    main()
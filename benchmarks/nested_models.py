@@ -0,0 +1,96 @@
+"""
+Compare composite typedefs with converting each element through
+TypeEngine.load/dump, on a deeply nested tree of models.
+
+    python benchmarks/nested_models.py [--depth N] [--width N]
+"""
+import argparse
+import timeit
+
+from common import Integer
+from declare import (Field, List, ModelMetaclass, Optional, TypeDefinition,
+                     TypeEngine)
+
+
+class EngineList(TypeDefinition):
+    """Looks up the item typedef in the engine for every element"""
+    def __init__(self, typedef):
+        self.typedef = typedef
+
+    def _register(self, engine):
+        engine.register(self.typedef)
+
+    def bind(self, engine, **config):
+        def load(values, **kwargs):
+            return [engine.load(self.typedef, v, **kwargs) for v in values]
+
+        def dump(values, **kwargs):
+            return [engine.dump(self.typedef, v, **kwargs) for v in values]
+        return load, dump
+
+
+class EngineOptional(EngineList):
+    def bind(self, engine, **config):
+        def load(value, **kwargs):
+            if value is None:
+                return None
+            return engine.load(self.typedef, value, **kwargs)
+
+        def dump(value, **kwargs):
+            if value is None:
+                return None
+            return engine.dump(self.typedef, value, **kwargs)
+        return load, dump
+
+
+def make_models(list_type, optional_type):
+    item = Integer()
+
+    class Node(metaclass=ModelMetaclass):
+        value = Field(typedef=item)
+        weights = Field(typedef=list_type(item))
+        label = Field(typedef=optional_type(item))
+        children = Field(typedef=list_type(lambda: Node))
+
+    if list_type is EngineList:
+        # EngineList doesn't resolve functions, so patch in the model
+        Node.children.typedef.typedef = Node
+    return Node
+
+
+def make_wire(depth, width):
+    node = {"value": "1", "weights": ["1", "2", "3"], "label": None,
+            "children": []}
+    if depth:
+        node["children"] = [make_wire(depth - 1, width)
+                            for _ in range(width)]
+    return node
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--width", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    wire = make_wire(args.depth, args.width)
+    nodes = sum(args.width ** level for level in range(args.depth + 1))
+    for name, types in (("engine lookups", (EngineList, EngineOptional)),
+                        ("composites", (List, Optional))):
+        model = make_models(*types)
+        engine = TypeEngine.unique()
+        engine.register(model)
+        engine.bind()
+        obj = engine.load(model, wire)
+        assert engine.dump(model, obj) == wire
+        load = min(timeit.repeat(lambda: engine.load(model, wire),
+                                 number=1, repeat=args.repeat))
+        dump = min(timeit.repeat(lambda: engine.dump(model, obj),
+                                 number=1, repeat=args.repeat))
+        print("{:<15} load {:8.2f} ms  dump {:8.2f} ms  ({} nodes)".format(
+            name, load * 1e3, dump * 1e3, nodes))
+
+
+if __name__ == "__main__":
+    main()
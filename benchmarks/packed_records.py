@@ -0,0 +1,68 @@
+"""
+Compare JSON with TypeEngine.pack_many/unpack_many for a fixed-width model.
+
+    python benchmarks/packed_records.py [--fields N] [--records N]
+"""
+import argparse
+import json
+import timeit
+
+from common import make_model
+from declare import TypeDefinition, TypeEngine
+
+
+class Int64(TypeDefinition):
+    """Backed by int rather than str, so it has a fixed-width format"""
+    python_type = int
+    backing_type = int
+
+    def _load(self, value, **kwargs):
+        return value
+
+    def _dump(self, value, **kwargs):
+        return value
+
+
+class Real(Int64):
+    python_type = float
+    backing_type = float
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--fields", type=int, default=8)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model = make_model(args.fields, typedefs=(Int64, Real))
+    engine = TypeEngine.unique()
+    engine.register(model)
+    engine.bind()
+    wire = {field.model_name: (1234567 if i % 2 == 0 else 1234.5678)
+            for i, field in enumerate(model.Meta.fields)}
+    objs = engine.load_many(model, [wire] * args.records)
+
+    def json_dump():
+        return json.dumps(engine.dump_many(model, objs)).encode("utf-8")
+
+    def json_load():
+        return engine.load_many(model, json.loads(encoded))
+
+    def pack():
+        return engine.pack_many(model, objs)
+
+    def unpack():
+        return engine.unpack_many(model, packed)
+
+    encoded, packed = json_dump(), pack()
+    for name, func in (("json dump", json_dump), ("pack_many", pack),
+                       ("json load", json_load), ("unpack_many", unpack)):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print("{:<12} {:8.2f} ms".format(name, best * 1e3))
+    print("json bytes   {:>8}".format(len(encoded)))
+    print("packed bytes {:>8}".format(len(packed)))
+
+
+if __name__ == "__main__":
+    main()
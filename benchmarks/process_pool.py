@@ -0,0 +1,68 @@
+"""
+Find where TypeEngine.dump_many_parallel beats dump_many for a CPU-heavy
+typedef (zlib + base64).
+
+    python benchmarks/process_pool.py [--workers N] [--chunk-size N]
+"""
+import argparse
+import base64
+import concurrent.futures
+import os
+import time
+import zlib
+
+import common  # noqa: F401 (puts the checkout on sys.path)
+from declare import TypeDefinition, TypeEngine
+
+
+class Compressed(TypeDefinition):
+    python_type = bytes
+    backing_type = str
+
+    def _load(self, value, **kwargs):
+        return zlib.decompress(base64.b64decode(value))
+
+    def _dump(self, value, **kwargs):
+        return base64.b64encode(zlib.compress(value, 9)).decode("ascii")
+
+
+def best_of(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=250)
+    parser.add_argument("--value-bytes", type=int, default=2048)
+    args = parser.parse_args()
+
+    typedef = Compressed()
+    engine = TypeEngine("benchmark.process_pool")
+    engine.register(typedef)
+    engine.bind()
+    value = os.urandom(args.value_bytes // 2) * 2
+
+    print("{:>8} {:>12} {:>12}  {}".format(
+        "values", "serial (s)", "pool (s)", "speedup"))
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as executor:
+        # Start the workers before timing anything
+        engine.dump_many_parallel(typedef, [value] * args.workers,
+                                  chunk_size=1, executor=executor)
+        for n in (10, 100, 1000, 10000):
+            values = [value] * n
+            serial = best_of(lambda: engine.dump_many(typedef, values))
+            pool = best_of(lambda: engine.dump_many_parallel(
+                typedef, values, chunk_size=args.chunk_size,
+                executor=executor))
+            print("{:>8} {:>12.4f} {:>12.4f}  {:.2f}x".format(
+                n, serial, pool, serial / pool))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Compare loading positional rows with Model.from_rows against zipping them
+into wire dicts for TypeEngine.load_many, and dumping back to rows.
+
+    python benchmarks/row_models.py [--records N]
+"""
+import argparse
+import timeit
+
+from common import make_model
+from declare import TypeEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    model = make_model(4)
+    engine = TypeEngine.unique()
+    engine.register(model)
+    engine.bind()
+    names = [field.model_name for field in model.Meta.fields]
+    rows = [(str(i),) * len(names) for i in range(args.records)]
+
+    def via_dicts():
+        return engine.load_many(model, [dict(zip(names, row))
+                                        for row in rows])
+
+    def via_rows():
+        return list(model.from_rows(rows, engine=engine))
+
+    objs = via_rows()
+
+    def dump_dicts():
+        return [tuple(wire[name] for name in names)
+                for wire in engine.dump_many(model, objs)]
+
+    def dump_rows():
+        return list(model.to_rows(objs, engine=engine))
+
+    for name, func in (("load dicts", via_dicts), ("load rows", via_rows),
+                       ("dump dicts", dump_dicts), ("dump rows", dump_rows)):
+        elapsed = min(timeit.repeat(func, number=1, repeat=5))
+        print("{:<10} {:8.1f} ms".format(name, elapsed * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Compare per-instance memory and field access for Meta.slots models.
+
+    python benchmarks/slotted_models.py [--fields N] [--instances N]
+"""
+import argparse
+import timeit
+import tracemalloc
+
+from common import make_model
+
+
+def bytes_per_instance(model, n_instances):
+    names = [field.model_name for field in model.Meta.fields]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = []
+    for _ in range(n_instances):
+        obj = model()
+        for name in names:
+            setattr(obj, name, None)
+        objs.append(obj)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / n_instances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--fields", type=int, default=8)
+    parser.add_argument("--instances", type=int, default=100000)
+    args = parser.parse_args()
+
+    for slots in (False, True):
+        model = make_model(args.fields, typedefs=(None,), slots=slots)
+        obj = model()
+        obj.f0 = 1
+        size = bytes_per_instance(model, args.instances)
+        get = min(timeit.repeat(lambda: obj.f0, number=100000, repeat=5))
+        print("slots={!s:<5} {:8.1f} bytes/instance {:8.3f} us/get".format(
+            slots, size, get / 100000 * 1e6))
+
+
+if __name__ == "__main__":
+    main()
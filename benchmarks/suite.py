@@ -0,0 +1,274 @@
+"""
+Benchmark suite for declare's hot paths.
+
+    python benchmarks/suite.py run [--filter TEXT] [--output FILE]
+    python benchmarks/suite.py compare [BASELINE] [--threshold 0.10]
+
+``run`` prints each benchmark and optionally saves the results as JSON.
+``compare`` runs the same benchmarks and exits non-zero when any of them is
+slower (or uses more memory) than the baseline by more than the threshold.
+The default baseline is benchmarks/baseline.json.  Timings only compare
+on the same machine, so it isn't checked in: record it with
+``run --output benchmarks/baseline.json`` before making a change.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+# common puts the checkout on sys.path, so import it before declare
+from common import Integer, make_model
+import declare
+from declare import Field, TypeDefinition, TypeEngine, TypeEngineMeta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+BENCHMARKS = {}
+
+
+def benchmark(name, unit="us"):
+    """
+    Register a benchmark.
+
+    For unit "us" the decorated function returns ``(func, ops)``: ``func``
+    is timed, and performs ``ops`` operations per call.  For unit "bytes"
+    the function returns the measured size directly.
+    """
+    def register(func):
+        BENCHMARKS[name] = (func, unit)
+        return func
+    return register
+
+
+def bound(*typedefs):
+    engine = TypeEngine.unique()
+    for typedef in typedefs:
+        engine.register(typedef)
+    engine.bind()
+    return engine
+
+
+@benchmark("engine.load")
+def engine_load():
+    typedef = Integer()
+    engine = bound(typedef)
+    return (lambda: engine.load(typedef, "1")), 1
+
+
+@benchmark("engine.dump")
+def engine_dump():
+    typedef = Integer()
+    engine = bound(typedef)
+    return (lambda: engine.dump(typedef, 1)), 1
+
+
+@benchmark("engine.load_many[1000]")
+def engine_load_many():
+    typedef = Integer()
+    engine = bound(typedef)
+    values = ["1"] * 1000
+    return (lambda: engine.load_many(typedef, values)), 1000
+
+
+@benchmark("field.__get__")
+def field_get():
+    obj = make_model(1)()
+    obj.f0 = 1
+    return (lambda: obj.f0), 1
+
+
+@benchmark("field.__set__")
+def field_set():
+    obj = make_model(1)()
+
+    def set_field():
+        obj.f0 = 1
+    return set_field, 1
+
+
+@benchmark("field.__get__[slots]")
+def field_get_slots():
+    obj = make_model(1, slots=True)()
+    obj.f0 = 1
+    return (lambda: obj.f0), 1
+
+
+@benchmark("ModelMetaclass.__new__[50 fields]")
+def model_class_creation():
+    return (lambda: make_model(50)), 1
+
+
+@benchmark("ModelMetaclass.__new__[deferred]")
+def model_class_creation_deferred():
+    return (lambda: make_model(50, deferred=True)), 1
+
+
+@benchmark("model load[20 fields]")
+def model_load():
+    model = make_model(20)
+    engine = bound(model)
+    wire = {field.model_name: "1" for field in model.Meta.fields}
+    return (lambda: engine.load(model, wire)), 1
+
+
+@benchmark("model dump[20 fields]")
+def model_dump():
+    model = make_model(20)
+    engine = bound(model)
+    obj = engine.load(model, {f.model_name: "1" for f in model.Meta.fields})
+    return (lambda: engine.dump(model, obj)), 1
+
+
+@benchmark("TypeEngine.bind[100 typedefs]")
+def engine_bind():
+    def bind():
+        engine = TypeEngine.unique()
+        for _ in range(100):
+            engine.register(Integer())
+        engine.bind()
+        # Don't let thousands of unique engines pile up between runs
+        TypeEngineMeta.engines.pop(engine.namespace)
+    return bind, 1
+
+
+@benchmark("TypeEngineMeta.__call__")
+def engine_lookup():
+    TypeEngine("benchmark.lookup")
+    return (lambda: TypeEngine("benchmark.lookup")), 1
+
+
+@benchmark("index[1000]")
+def index_objects():
+    fields = [Field() for _ in range(1000)]
+    for i, field in enumerate(fields):
+        field.model_name = "f{}".format(i)
+    return (lambda: declare.index(fields, "model_name")), 1000
+
+
+def bytes_per_instance(model, n=10000):
+    wire = {field.model_name: "1" for field in model.Meta.fields}
+    engine = bound(model)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [engine.load(model, wire) for _ in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return (after - before) / n
+
+
+@benchmark("memory per instance[10 fields]", unit="bytes")
+def memory_dict():
+    return bytes_per_instance(make_model(10))
+
+
+@benchmark("memory per instance[10 fields, slots]", unit="bytes")
+def memory_slots():
+    return bytes_per_instance(make_model(10, slots=True))
+
+
+@benchmark("memory per bound typedef", unit="bytes")
+def memory_bound_typedef(n=10000):
+    engine = TypeEngine.unique()
+    for _ in range(n):
+        engine.register(TypeDefinition())
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    engine.bind()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    TypeEngineMeta.engines.pop(engine.namespace)
+    return (after - before) / n
+
+
+def run(names, repeat):
+    results = {}
+    for name in names:
+        func, unit = BENCHMARKS[name]
+        if unit == "bytes":
+            value = func()
+        else:
+            timed, ops = func()
+            timer = timeit.Timer(timed)
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeat, number=number))
+            value = best / number / ops * 1e6
+        results[name] = {"value": value, "unit": unit}
+        print("{:<40} {:12.4f} {}".format(name, value, unit))
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "declare": declare.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    run_parser = subparsers.add_parser("run", help="run and print results")
+    run_parser.add_argument("--output", help="save results as JSON")
+    compare_parser = subparsers.add_parser(
+        "compare", help="run and compare against a saved baseline")
+    compare_parser.add_argument("baseline", nargs="?",
+                                default=DEFAULT_BASELINE)
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.10,
+        help="fraction slower than baseline that counts as a regression")
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--filter", default="",
+                         help="only run benchmarks containing this text")
+        sub.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.command == "run":
+        results = run(names, args.repeat)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"environment": environment(), "results": results},
+                          f, indent=2, sort_keys=True)
+                f.write("\n")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline at {0}; record one with "
+              "`run --output {0}`".format(args.baseline))
+        return 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["environment"] != environment():
+        print("warning: baseline was recorded on {}".format(
+            baseline["environment"]))
+    results = run(names, args.repeat)
+    regressions = []
+    print()
+    for name, result in results.items():
+        expected = baseline["results"].get(name)
+        if expected is None:
+            print("{:<40} (not in baseline)".format(name))
+            continue
+        change = result["value"] / expected["value"] - 1
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{:<40} {:+8.1%}{}".format(name, change, flag))
+    if regressions:
+        print("\n{} regression(s) beyond {:.0%}".format(
+            len(regressions), args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,43 @@
 """Declarative scaffolding for frameworks"""
+import array
 import collections
+import collections.abc
+import concurrent.futures
+import functools
+import hashlib
+import importlib.util
+import inspect
+import itertools
+import marshal
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+import time
+import types
 import uuid
-import warnings
+import weakref
 __all__ = ["ModelMetaclass", "Field", "TypeDefinition",
-           "TypeEngine", "DeclareException"]
+           "TypeEngine", "DeclareException", "ColumnBatch", "LoadFailure",
+           "CacheInfo", "MetricsInfo", "BoundType", "TypeHandle",
+           "changes", "clear_changes", "RecordReader", "RecordWriter",
+           "List", "Map", "Optional", "InternInfo"]
 __version__ = "0.9.12"
 
 missing = object()
+# Streaming error modes for TypeEngine.iter_load and TypeEngine.iter_dump
+_error_modes = ("raise", "drop", "collect")
+# Eviction policies for memoized typedefs
+_cache_policies = ("lru", "fifo")
+# Default struct formats for packing fixed-width backing types
+_struct_formats = {int: "q", float: "d", bool: "?"}
 # These engines can't be cleared
 _fixed_engines = collections.ChainMap()
+# Held while finalizing a model; see ModelMetaclass.finalize
+_finalize_lock = threading.Lock()
 
 
 class DeclareException(Exception):
@@ -19,21 +48,168 @@ class DeclareException(Exception):
     pass
 
 
+LoadFailure = collections.namedtuple(
+    "LoadFailure", ["index", "value", "exception", "field"])
+# field defaults to None; namedtuple's defaults argument needs Python 3.7
+LoadFailure.__new__.__defaults__ = (None,)
+LoadFailure.__doc__ = """
+A value that failed to convert, collected instead of raised.
+
+``index`` is the position of the value in the input, ``value`` is the input
+value, and ``exception`` is the exception raised while converting it.  When
+a model fails to load, there is one failure for each field that failed:
+``field`` is the field's ``model_name`` and ``value`` is the field's wire
+value.  Otherwise ``field`` is ``None``.
+"""
+
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "evictions", "bypassed", "size", "maxsize"])
+CacheInfo.__doc__ = """
+Counters for a memoized load or dump function.
+
+``bypassed`` counts calls whose value or context wasn't hashable, which are
+never cached.  Expired entries count as misses and evictions.
+"""
+
+
+InternInfo = collections.namedtuple(
+    "InternInfo",
+    ["hits", "distinct", "rejected", "bypassed", "bytes_saved", "maxsize"])
+InternInfo.__doc__ = """
+Counters for an interned load function.
+
+``hits`` counts loads that returned a value already in the table, and
+``distinct`` is the number of values in the table.  ``rejected`` counts new
+values that weren't added because the table was full, and ``bypassed``
+counts unhashable results.  ``bytes_saved`` adds up the shallow size
+(:func:`sys.getsizeof`) of each loaded copy that was replaced by the
+interned value.
+"""
+
+
+MetricsInfo = collections.namedtuple(
+    "MetricsInfo", ["calls", "errors", "total", "p50", "p90", "p99"])
+MetricsInfo.__doc__ = """
+Metrics for one typedef operation, from :meth:`TypeEngine.metrics`.
+
+``total`` and the percentiles are in seconds.  Percentiles are computed from
+the most recent calls only.
+"""
+
+
+class BoundType(collections.namedtuple("BoundType", [
+        "load", "dump", "load_many", "dump_many"])):
+    """
+    Functions bound to a :class:`~TypeEngine` for one typedef.
+
+    Stored in :attr:`TypeEngine.bound_types`.  ``load_many`` and
+    ``dump_many`` are the typedef's batch hooks (see
+    :meth:`TypeDefinition.bind_many`), or ``None`` when it has none; the
+    engine's batch methods then call ``load`` or ``dump`` once per value.
+    ``async_load`` and ``async_dump`` are true when the matching function
+    is a coroutine function.  Fields can also be looked up by name, as in
+    ``bound_type["load"]``.
+    """
+    __slots__ = ()
+
+    @property
+    def async_load(self):
+        return inspect.iscoroutinefunction(self.load)
+
+    @property
+    def async_dump(self):
+        return inspect.iscoroutinefunction(self.dump)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return super().__getitem__(key)
+
+
+class TypeHandle:
+    """
+    Pre-resolved bound functions for one typedef, from
+    :meth:`TypeEngine.handle`.
+
+    ``load``, ``dump``, ``load_many`` and ``dump_many`` are the bound
+    functions themselves, with ``load_many`` and ``dump_many`` looping over
+    ``load`` and ``dump`` for typedefs without batch hooks.  ``generation``
+    is the engine's :attr:`~TypeEngine.generation` when the handle was last
+    refreshed.
+    """
+    __slots__ = ("engine", "typedef", "generation",
+                 "load", "dump", "load_many", "dump_many")
+
+    def __init__(self, engine, typedef):
+        self.engine = engine
+        self.typedef = typedef
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-read the bound functions from the engine.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the typedef is no longer bound to the engine
+
+        """
+        try:
+            bound_type = self.engine.bound_types[self.typedef]
+        except KeyError:
+            raise DeclareException(
+                "Can't find unknown type {}".format(self.typedef))
+        self.load, self.dump = bound_type.load, bound_type.dump
+        self.load_many = _many(bound_type.load, bound_type.load_many)
+        self.dump_many = _many(bound_type.dump, bound_type.dump_many)
+        self.generation = self.engine.generation
+
+
 class TypeEngineMeta(type):
     """
     Factory for :class:`~TypeEngine` so that each engine is init'd only once.
 
     This is necessary since if :meth:`~TypeEngine.__new__` returns an instance
     of the class, the :meth:`~TypeEngine.__init__` method will be called.
+
+    Looking up an existing engine doesn't take a lock.  Creating one holds a
+    lock for that namespace only, and the engine isn't visible to other
+    threads until its ``__init__`` has returned.
     """
     engines = _fixed_engines.new_child()
+    # {namespace: lock} for engines being created
+    _creating = {}
+    # Engines whose __init__ is running, so it can look itself up
+    _initializing = {}
+    _lock = threading.Lock()
 
     def __call__(cls, namespace, *args, **kwargs):
         engine = TypeEngineMeta.engines.get(namespace)
-        if engine is None:
-            engine = cls.__new__(cls)
-            TypeEngineMeta.engines[namespace] = engine
-            cls.__init__(engine, namespace, *args, **kwargs)
+        if engine is not None:
+            return engine
+        with TypeEngineMeta._lock:
+            lock = TypeEngineMeta._creating.setdefault(
+                namespace, threading.RLock())
+        with lock:
+            engine = TypeEngineMeta.engines.get(namespace)
+            if engine is None:
+                engine = TypeEngineMeta._initializing.get(namespace)
+            if engine is None:
+                engine = cls.__new__(cls)
+                TypeEngineMeta._initializing[namespace] = engine
+                try:
+                    cls.__init__(engine, namespace, *args, **kwargs)
+                finally:
+                    del TypeEngineMeta._initializing[namespace]
+                TypeEngineMeta.engines[namespace] = engine
+                with TypeEngineMeta._lock:
+                    del TypeEngineMeta._creating[namespace]
         return engine
 
     @classmethod
@@ -53,16 +229,38 @@ class TypeEngine(object, metaclass=TypeEngineMeta):
     This makes it easier for groups of components to use a single engine to
     translate values by type.  By default :meth:`~TypeEngine.load` and
     :meth:`~TypeEngine.dump` require a reference to the typedef used to convert
-    values.  A custom Engine could use the :class:`~TypeDefinition` attributes
-    ``python_type`` and ``backing_type`` to find the correct typedef from the
-    set of available typedefs and automatically convert to the necessary
-    format.
+    values.  :meth:`~TypeEngine.dump_value` and :meth:`~TypeEngine.load_value`
+    instead use the :class:`~TypeDefinition` attributes ``python_type`` and
+    ``backing_type`` to find the correct typedef from the set of bound
+    typedefs.
 
     """
     def __init__(self, namespace="global", *args, **kwargs):
         self.namespace = namespace
         self.unbound_types = set()
         self.bound_types = {}
+        # Registration order, so parallel binds are deterministic
+        self._registered = {}
+        # {python_type: typedef} and {backing_type: typedef}, built by bind
+        self._by_python_type = {}
+        self._by_backing_type = {}
+        # {class: bound type or None}, filled by walking the MRO on a miss
+        self._python_type_cache = {}
+        self._backing_type_cache = {}
+        # Incremented whenever bound_types changes; see handle()
+        self.generation = 0
+        # Set by freeze()
+        self.frozen = False
+        self._handles = {}
+        # {(typedef, operation): _OpStats} while metrics are enabled
+        self._metrics = None
+        self._metrics_samples = 0
+        self._uninstrumented = {}
+        # Held while registering and binding.  Reentrant, since a model's
+        # bind binds its field typedefs through the same engine.
+        self._lock = threading.RLock()
+        # Typedefs taken out of unbound_types by a running bind_parallel
+        self._binding = set()
 
     @classmethod
     def unique(cls):
@@ -95,12 +293,15 @@ class TypeEngine(object, metaclass=TypeEngineMeta):
         """
         if typedef in self.bound_types:
             return
-        if not self.is_compatible(typedef):
-            raise ValueError("Incompatible type {} for engine {}".format(
-                typedef, self))
-        if typedef not in self.unbound_types:
-            self.unbound_types.add(typedef)
-            typedef._register(self)
+        with self._lock:
+            self._check_mutable("register with")
+            if not self.is_compatible(typedef):
+                raise ValueError("Incompatible type {} for engine {}".format(
+                    typedef, self))
+            if typedef not in self.unbound_types | self._binding:
+                self.unbound_types.add(typedef)
+                self._registered.setdefault(typedef, len(self._registered))
+                typedef._register(self)
 
     def bind(self, **config):
         """
@@ -108,8 +309,12 @@ class TypeEngine(object, metaclass=TypeEngineMeta):
 
         Bind each unbound typedef to the engine, passing in the engine and
         :attr:`config`.  The resulting ``load`` and ``dump`` functions can
-        be found under ``self.bound_types[typedef]["load"]`` and
-        ``self.bound_types[typedef]["dump"], respectively.
+        be found under ``self.bound_types[typedef].load`` and
+        ``self.bound_types[typedef].dump``, respectively (see
+        :class:`~BoundType`).  Batch functions from
+        :meth:`~TypeDefinition.bind_many` are stored as ``load_many`` and
+        ``dump_many``; when a typedef doesn't provide one, a per-item loop
+        over the single-value function is used instead.
 
         Parameters
         ----------
@@ -120,16 +325,255 @@ class TypeEngine(object, metaclass=TypeEngineMeta):
             that a typedef needs to construct a load/dump function pair.
 
         """
-        while self.unbound_types:
-            typedef = self.unbound_types.pop()
+        with self._lock:
+            self._check_mutable("bind")
+            while self.unbound_types:
+                typedef = self.unbound_types.pop()
+                self._bind(typedef, config)
+
+    def freeze(self):
+        """
+        Make the engine immutable, for lock-free use from many threads.
+
+        :attr:`bound_types` is replaced by a read-only mapping of the
+        (immutable) :class:`~BoundType` records, and a :class:`~TypeHandle`
+        is created up front for every typedef.  After this, load, dump and
+        the other conversion methods only read from structures that never
+        change, while :meth:`~TypeEngine.register`, :meth:`~TypeEngine.bind`
+        and enabling or disabling metrics raise :class:`~DeclareException`.
+        The per-class caches used by :meth:`~TypeEngine.dump_value` and
+        :meth:`~TypeEngine.load_value` are still filled on a miss; each
+        entry is written whole, so concurrent misses are harmless.
+
+        Because nothing is written on the conversion paths, worker
+        processes forked after freezing share the engine's memory with the
+        parent.  Call :func:`gc.freeze` before forking to also keep the
+        garbage collector from touching those pages.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If any registered typedef has not been bound yet
+
+        Returns
+        -------
+        engine : :class:`~TypeEngine`
+            This engine, to allow ``engine = TypeEngine("api").freeze()``
+
+        """
+        with self._lock:
+            if self.frozen:
+                return self
+            if self.unbound_types or self._binding:
+                raise DeclareException(
+                    "Can't freeze engine {} with unbound types {}".format(
+                        self.namespace, self.unbound_types | self._binding))
+            for typedef in self.bound_types:
+                self.handle(typedef)
+            self.bound_types = types.MappingProxyType(dict(self.bound_types))
+            self.unbound_types = frozenset()
+            self.frozen = True
+            return self
+
+    def _check_mutable(self, action):
+        if self.frozen:
+            raise DeclareException("Can't {} frozen engine {}".format(
+                action, self.namespace))
+
+    def _bind(self, typedef, config):
+        """
+        Bind a single typedef that has already been removed from
+        :attr:`unbound_types`.  On failure the typedef is returned to
+        :attr:`unbound_types` before the exception is re-raised.
+        """
+        start = time.perf_counter()
+        try:
+            bound_type = self._bound_type(typedef, config)
+        except Exception:
+            self.unbound_types.add(typedef)
+            self._record_bind(typedef, time.perf_counter() - start, True)
+            raise
+        self._record_bind(typedef, time.perf_counter() - start, False)
+        self._store(typedef, bound_type)
+
+    def _store(self, typedef, bound_type):
+        """Save a bound type and index it by python_type and backing_type"""
+        if self._metrics is not None:
+            self._uninstrumented[typedef] = bound_type
+            bound_type = self._instrument(typedef, bound_type)
+        self.bound_types[typedef] = bound_type
+        self.generation += 1
+        handle = self._handles.get(typedef)
+        if handle is not None:
+            handle.refresh()
+        for index, key in ((self._by_python_type, typedef.python_type),
+                           (self._by_backing_type, typedef.backing_type)):
+            if key is None:
+                continue
+            # The earliest registered typedef wins when types are shared
+            other = index.get(key)
+            if other is None or (self._registered.get(other, -1) >
+                                 self._registered.get(typedef, -1)):
+                index[key] = typedef
+        self._python_type_cache.clear()
+        self._backing_type_cache.clear()
+
+    def _bound_type(self, typedef, config):
+        """Call the typedef's bind functions and build its bound_types entry"""
+        load, dump = typedef.bind(self, **config)
+        load_many, dump_many = typedef.bind_many(self, **config)
+        validators = tuple(_typedef_option(typedef, "validators"))
+        if validators:
+            load = _validated(load, validators)
+            if load_many is not None:
+                load_many = _validated_many(load_many, validators)
+        memoize = _typedef_option(typedef, "memoize")
+        if memoize is None:
+            memoize = config.get("memoize")
+        if memoize:
+            options = {} if memoize is True else dict(memoize)
+            if not inspect.iscoroutinefunction(load):
+                load = _Memoized(load, **options)
+            if not inspect.iscoroutinefunction(dump):
+                dump = _Memoized(dump, **options)
+        intern = _typedef_option(typedef, "intern")
+        if intern is None:
+            intern = config.get("intern")
+        if intern and not inspect.iscoroutinefunction(load):
+            options = {} if intern is True else dict(intern)
+            load = _interned(load, **options)
+        return BoundType(load, dump, load_many, dump_many)
+
+    def bind_parallel(self, *, executor=None, max_workers=None, **config):
+        """
+        Bind all unbound types to the engine, using a pool of threads.
+
+        Useful when typedefs do expensive work in :meth:`TypeDefinition.bind`
+        such as building lookup tables or compiling regular expressions.
+        Typedefs are bound concurrently, then added to :attr:`bound_types`
+        in the order they were registered, so the result doesn't depend on
+        scheduling.  Models are bound afterwards, in this thread, since
+        they inline the functions of their field typedefs.  The engine isn't
+        locked while the workers run, so a typedef's bind can register and
+        bind other typedefs through it.
+
+        As with :meth:`~TypeEngine.bind`, a typedef whose bind raises is
+        returned to :attr:`unbound_types`.  Every other typedef that bound
+        successfully is kept, and the exception from the earliest
+        registered failing typedef is raised.
+
+        Parameters
+        ----------
+        executor : :class:`concurrent.futures.Executor`, optional
+            Executor to submit binds to.  Bound functions are usually
+            closures, so this should be a thread pool.  By default a new
+            :class:`~concurrent.futures.ThreadPoolExecutor` is used.
+        max_workers : int, optional
+            Passed to the default executor
+        config : dict, optional
+            Engine-binding configuration to pass to each typedef
+
+        Returns
+        -------
+        timings : dict
+            Seconds spent in each typedef's bind, in registration order
+
+        """
+        def order(typedef):
+            return self._registered.get(typedef, -1)
+
+        def timed_bind(typedef):
+            start = time.perf_counter()
+            bound_type = self._bound_type(typedef, config)
+            return bound_type, time.perf_counter() - start
+
+        # Take the typedefs out of unbound_types, then release the lock while
+        # the workers run: a typedef's bind may register or bind other
+        # typedefs through this engine, from a worker thread.
+        with self._lock:
+            self._check_mutable("bind")
+            typedefs = sorted(self.unbound_types, key=order)
+            parallel = [t for t in typedefs if not _binds_children(t)]
+            serial = [t for t in typedefs if _binds_children(t)]
+            self.unbound_types.difference_update(typedefs)
+            self._binding.update(typedefs)
+        try:
+            own_executor = executor is None
+            if own_executor:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers)
             try:
-                load, dump = typedef.bind(self, **config)
-                self.bound_types[typedef] = {
-                    "load": load, "dump": dump
-                }
-            except Exception:
-                self.unbound_types.add(typedef)
-                raise
+                futures = [executor.submit(timed_bind, t) for t in parallel]
+                concurrent.futures.wait(futures)
+            finally:
+                if own_executor:
+                    executor.shutdown()
+        except BaseException:
+            with self._lock:
+                self.unbound_types.update(parallel)
+            raise
+        finally:
+            with self._lock:
+                self._binding.difference_update(typedefs)
+                # Models go back so a model's bind can bind nested models
+                self.unbound_types.update(serial)
+
+        with self._lock:
+            timings = {}
+            error = None
+            for typedef, future in zip(parallel, futures):
+                exc = future.exception()
+                if exc is not None:
+                    self.unbound_types.add(typedef)
+                    self._record_bind(typedef, 0.0, True)
+                    error = error or exc
+                else:
+                    bound_type, timings[typedef] = future.result()
+                    self._record_bind(typedef, timings[typedef], False)
+                    self._store(typedef, bound_type)
+            if error is not None:
+                raise error
+
+            for typedef in serial:
+                # Skip anything bound while binding an earlier model
+                if typedef in self.unbound_types:
+                    self.unbound_types.remove(typedef)
+                    start = time.perf_counter()
+                    self._bind(typedef, config)
+                    timings[typedef] = time.perf_counter() - start
+            timings = sorted(timings.items(), key=lambda item: order(item[0]))
+            return dict(timings)
+
+    def handle(self, typedef):
+        """
+        Return a :class:`~TypeHandle` for a bound typedef.
+
+        A handle's ``load`` and ``dump`` attributes are the bound functions
+        themselves, so calling them skips the ``bound_types`` lookup done by
+        :meth:`~TypeEngine.load` and :meth:`~TypeEngine.dump`.  The engine
+        keeps one handle per typedef and refreshes it in place whenever the
+        typedef's bound functions change (for example when metrics are
+        enabled), so a handle can be kept for the life of the engine.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine
+
+        Example
+        -------
+
+        .. code-block:: python
+
+            load = engine.handle(typedef).load
+            values = [load(value) for value in column]
+
+        """
+        handle = self._handles.get(typedef)
+        if handle is None:
+            # Two threads may race to create the first handle; keep one
+            handle = self._handles.setdefault(
+                typedef, TypeHandle(self, typedef))
+        return handle
 
     def load(self, typedef, value, **kwargs):
         """
@@ -185,7 +629,7 @@ class TypeEngine(object, metaclass=TypeEngineMeta):
                 "Can't load unknown type {}".format(typedef))
         else:
             # Don't need to try/catch since load/dump are bound together
-            return bound_type["load"](value, **kwargs)
+            return bound_type.load(value, **kwargs)
 
     def dump(self, typedef, value, **kwargs):
         """
@@ -241,173 +685,1812 @@ class TypeEngine(object, metaclass=TypeEngineMeta):
                 "Can't dump unknown type {}".format(typedef))
         else:
             # Don't need to try/catch since load/dump are bound together
-            return bound_type["dump"](value, **kwargs)
+            return bound_type.dump(value, **kwargs)
 
-    def is_compatible(self, typedef):  # pragma: no cover
+    def load_many(self, typedef, values, *, errors="raise", failures=None,
+                  **kwargs):
         """
-        Returns ``true`` if the typedef is compatible with this engine.
+        Return the result of the bound load_many method for a typedef
+
+        Like :meth:`~TypeEngine.load`, but converts an iterable of values
+        with a single lookup.  Typedefs that implement
+        :meth:`~TypeDefinition.bind_many` may return any sequence (such as a
+        NumPy array); otherwise the result is a list.
+
+        With ``errors="collect"``, a value that fails to load is left out
+        of the result and described in ``failures`` instead, so one bad
+        value doesn't lose the rest of the batch.  Each value is still only
+        loaded once, unless the typedef's batch hook raises: then the batch
+        is retried one value at a time to find the failures.  For a model,
+        the failed record's fields are loaded again to report every field
+        that failed, with its ``model_name``.  ``Meta.lazy`` models are
+        loaded eagerly unless ``errors`` is ``"raise"``, so their failures
+        are found here instead of when a field is first read.
 
-        This function should return ``False`` otherwise.  The default
-        implementation will always return ``True``.
+        Parameters
+        ----------
+        typedef : :class:`~TypeDefinition`
+            The typedef whose bound load_many method should be used
+        values : iterable
+            The values to be passed into the bound load_many method
+        errors : {"raise", "drop", "collect"}
+            What to do when a value fails to load; see
+            :meth:`~TypeEngine.iter_load`
+        failures : list, optional
+            Required when ``errors`` is ``"collect"``.
+            :class:`~LoadFailure` records are appended to it.
+        **kwargs : kwargs
+            Context for the values being loaded
 
-        """
-        return True
+        Returns
+        -------
+        loaded_values : sequence
+            The loaded values, in the same order as the input values.
+            Always a list unless ``errors`` is ``"raise"``.
 
-    def __contains__(self, typedef):
-        return typedef in self.bound_types
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine, or binds
+            coroutine functions
 
+        Example
+        -------
 
-_fixed_engines["global"] = TypeEngine("global")
+        .. code-block:: python
 
+            failures = []
+            users = engine.load_many(User, rows, errors="collect",
+                                     failures=failures)
+            for failure in failures:
+                log.warning("row %d: bad %s %r", failure.index,
+                            failure.field, failure.value)
 
-class TypeDefinition:
-    """
-    Translates between python types and backend/storage/transport types
+        """
+        bound_type = self._sync_bound_type(typedef, "load")
+        if errors == "raise":
+            return _many(bound_type.load, bound_type.load_many)(
+                values, **kwargs)
+        load = _eager(typedef, bound_type.load)
+        values = list(values)
+        loaded = []
+        for chunk in _iter_convert(
+                load, _many(load, bound_type.load_many),
+                self._has_batch_hook(typedef, "load"), values,
+                max(len(values), 1), errors, failures, kwargs,
+                _load_failures(self, typedef, kwargs)):
+            loaded.extend(chunk)
+        return loaded
+
+    def dump_many(self, typedef, values, **kwargs):
+        """
+        Return the result of the bound dump_many method for a typedef
 
-    A single TypeDefinition can be used for multiple TypeEngines, by
-    implementing :meth:`~TypeDefinition.bind` and returning different
-    (load, dump) function tuples for each engine.
+        Like :meth:`~TypeEngine.dump`, but converts an iterable of values
+        with a single lookup.  Typedefs that implement
+        :meth:`~TypeDefinition.bind_many` may return any sequence (such as a
+        NumPy array); otherwise the result is a list.
 
-    For TypeDefinitions that are loaded/dumped the same for every engine,
-    just implement :meth:`~TypeDefinition._load` and
-    :meth:`~TypeDefinition._dump`.
+        Parameters
+        ----------
+        typedef : :class:`~TypeDefinition`
+            The typedef whose bound dump_many method should be used
+        values : iterable
+            The values to be passed into the bound dump_many method
+        **kwargs : kwargs
+            Context for the values being dumped
 
-    """
-    python_type = None
-    backing_type = None
+        Returns
+        -------
+        dumped_values : sequence
+            The dumped values, in the same order as the input values
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine, or binds
+            coroutine functions
 
-    def bind(self, engine, **config):
         """
-        Return a pair of (load, dump) functions for a specific engine.
+        bound_type = self._sync_bound_type(typedef, "dump")
+        return _many(bound_type.dump, bound_type.dump_many)(values, **kwargs)
 
-        Some Types will load and dump values depending on certain config, or
-        for different :class:`~TypeEngine`.
+    def _sync_bound_type(self, typedef, operation):
+        """
+        Look up a typedef for a synchronous batch ``operation`` (``"load"``
+        or ``"dump"``), which can't await coroutine functions
+        """
+        try:
+            bound_type = self.bound_types[typedef]
+        except KeyError:
+            raise DeclareException(
+                "Can't {} unknown type {}".format(operation, typedef))
+        if getattr(bound_type, "async_" + operation):
+            raise DeclareException(
+                "Can't {0} typedef {1} with coroutine functions; use "
+                "a{0}_many instead".format(operation, typedef))
+        return bound_type
 
-        By default, this function will return the functions
-        :meth:`~TypeDefinition.load` and :meth:`~TypeDefinition._dump`.
+    def _has_batch_hook(self, typedef, operation):
+        """Whether the typedef bound its own load_many or dump_many"""
+        bound_type = self._uninstrumented.get(
+            typedef, self.bound_types[typedef])
+        return getattr(bound_type, operation + "_many") is not None
 
-        The default :meth:`~TypeDefintion._load` and
-        :meth:`~TypeDefintion._dump` functions simply return the input value.
+    def enable_metrics(self, samples=1024):
+        """
+        Start recording call counts, latency and errors per typedef.
+
+        While enabled, the bound load, dump, load_many and dump_many
+        functions in :attr:`bound_types` are replaced with timed wrappers,
+        and :meth:`~TypeEngine.bind` records how long each typedef took to
+        bind.  Disabling puts the original functions back, so a disabled
+        engine runs exactly the same code as one that was never
+        instrumented.
+
+        Models inline the uninstrumented functions of their fields when they
+        are bound, so field conversions inside a model are only recorded as
+        part of the model's own load and dump.
 
         Parameters
         ----------
-        engine : :class:`~TypeEngine`
-            The engine that will save these load, dump functions
-        config : dictionary
-            Optional configuration for creating the functions.
+        samples : int
+            Number of recent latencies kept per typedef and operation to
+            compute percentiles from
 
-        Returns
-        -------
-        (load, dump) : (func, func) tuple
-            Each function takes a value and context, and returns a single value
         """
-        return self._load, self._dump
+        with self._lock:
+            self._check_mutable("enable metrics on")
+            if self._metrics is not None:
+                return
+            self._metrics = {}
+            self._metrics_samples = samples
+            for typedef, bound_type in list(self.bound_types.items()):
+                self._store(typedef, bound_type)
+
+    def disable_metrics(self):
+        """Stop recording metrics and restore the uninstrumented functions"""
+        with self._lock:
+            self._check_mutable("disable metrics on")
+            if self._metrics is None:
+                return
+            self._metrics = None
+            for typedef, bound_type in self._uninstrumented.items():
+                if typedef in self.bound_types:
+                    self.bound_types[typedef] = bound_type
+            self._uninstrumented.clear()
+            self.generation += 1
+            for handle in self._handles.values():
+                handle.refresh()
+
+    def metrics(self):
+        """
+        Return a snapshot of the recorded metrics.
 
-    def _register(self, engine):
-        """Called when the type is registered with an engine."""
-        pass
+        Returns
+        -------
+        metrics : dict
+            ``{typedef: {operation: MetricsInfo}}`` where operation is one
+            of ``"load"``, ``"dump"``, ``"load_many"``, ``"dump_many"`` or
+            ``"bind"``.  Only operations that were called are included.
+            Empty when metrics are disabled.
 
-    def _load(self, value, **kwargs):
-        """
-        Engine-agnostic load function.  Implement this method for any
-        TypeDefinition whose load function does not depend on the TypeEngine
-        being used to load it.
+        Example
+        -------
 
-        NOTE: This will not be available at runtime -
-        TypeDefinitionMetaclass hides the reference at runtime to reduce the
-        chance of incorrectly using an engine-agnostic load method when the
-        TypeDefinition prefers an engine-specific load method.
+        .. code-block:: python
 
-        By default, returns :attr:`value` unchanged.
+            engine.enable_metrics()
+            handle_requests()
+            for typedef, ops in engine.metrics().items():
+                print(typedef, ops["load"].total, ops["load"].p99)
 
         """
-        return value
-
-    def _dump(self, value, **kwargs):
+        snapshot = {}
+        for (typedef, operation), stats in (self._metrics or {}).items():
+            if stats.calls:
+                snapshot.setdefault(typedef, {})[operation] = stats.info()
+        return snapshot
+
+    def reset_metrics(self):
+        """Zero all recorded metrics, without disabling them"""
+        for stats in (self._metrics or {}).values():
+            stats.reset()
+
+    def _op_stats(self, typedef, operation):
+        key = (typedef, operation)
+        stats = self._metrics.get(key)
+        if stats is None:
+            stats = self._metrics[key] = _OpStats(self._metrics_samples)
+        return stats
+
+    def _instrument(self, typedef, bound_type):
         """
-        Engine-agnostic dump function.  Implement this method for any
-        TypeDefinition whose dump function does not depend on the TypeEngine
-        being used to dump it.
+        Copy of a bound type with each function wrapped in a timer.  Batch
+        calls are timed as one operation, even without a batch hook.
+        """
+        functions = {
+            "load": bound_type.load, "dump": bound_type.dump,
+            "load_many": _many(bound_type.load, bound_type.load_many),
+            "dump_many": _many(bound_type.dump, bound_type.dump_many)}
+        return BoundType(**{
+            operation: _timed(func, self._op_stats(typedef, operation))
+            for operation, func in functions.items()})
+
+    def _record_bind(self, typedef, seconds, failed):
+        if self._metrics is not None:
+            self._op_stats(typedef, "bind").record(seconds, failed)
+
+    def dump_changes(self, obj, **kwargs):
+        """
+        Dump only the fields of a model instance that have changed.
 
-        NOTE: This will not be available at runtime -
-        TypeDefinitionMetaclass hides the reference at runtime to reduce the
-        chance of incorrectly using an engine-agnostic dump method when the
-        TypeDefinition prefers an engine-specific dump method.
+        Fields are dumped with their bound dump functions, the same as the
+        model's own dump.  Changed fields that were deleted have no value,
+        so they're left out of the result; compare with :func:`changes` to
+        find them.  Changes are not cleared; call :func:`clear_changes`
+        after the dumped values have been written.
 
-        By default, returns :attr:`value` unchanged.
+        Parameters
+        ----------
+        obj : object
+            Instance of a model with ``Meta.track_changes``
+        **kwargs : kwargs
+            Context for the values being dumped
+
+        Returns
+        -------
+        wire : dict
+            Dumped values of the changed fields, keyed by model_name
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If a changed field's typedef is not bound to this engine
 
         """
-        return value
+        model = obj.__class__
+        type(model).finalize(model)
+        fields = model.Meta.fields_by_model_name
+        wire = {}
+        for name in changes(obj):
+            field = fields[name]
+            try:
+                value = field.get(obj)
+            except AttributeError:
+                continue
+            if field.typedef is not None:
+                value = self.dump(field.typedef, value, **kwargs)
+            wire[name] = value
+        return wire
+
+    def pack_many(self, model, objs, **kwargs):
+        """
+        Dump model instances into a single buffer of fixed-width records.
 
+        Each instance is dumped with the model's bound dump, then its field
+        values are packed in ``Meta.fields`` order with the layout from
+        :meth:`ModelMetaclass.record_struct`.
 
-def subclassof(obj, classinfo):
-    """Wrap issubclass to only return True/False"""
-    try:
-        return issubclass(obj, classinfo)
-    except TypeError:
-        return False
+        Parameters
+        ----------
+        model : :class:`~ModelMetaclass`
+            Model of the instances, bound to this engine
+        objs : iterable
+            Instances to pack
+        **kwargs : kwargs
+            Context for the values being dumped
 
+        Returns
+        -------
+        buffer : bytearray
+            ``len(objs) * model.record_struct().size`` bytes
 
-def instanceof(obj, classinfo):
-    """Wrap isinstance to only return True/False"""
-    try:
-        return isinstance(obj, classinfo)
-    except TypeError:  # pragma: no cover
-        # No coverage since we never call this without a class,
-        # type, or tuple of classes, types, or such typles.
-        return False
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the model can't be packed, isn't bound to this engine, or
+            an instance is missing a field
 
+        """
+        record = type(model).record_struct(model)
+        names = [field.model_name for field in model.Meta.fields]
+        wires = self.dump_many(model, objs, **kwargs)
+        buffer = bytearray(record.size * len(wires))
+        offset = 0
+        for wire in wires:
+            try:
+                values = [wire[name] for name in names]
+            except KeyError as exc:
+                raise DeclareException(
+                    "Can't pack {} without field {}".format(
+                        model.__name__, exc)) from None
+            record.pack_into(buffer, offset, *values)
+            offset += record.size
+        return buffer
+
+    def unpack_many(self, model, buffer, **kwargs):
+        """
+        Load model instances from a buffer written by
+        :meth:`~TypeEngine.pack_many`.
 
-class Field:
-    def __init__(self, *, typedef=None, **kwargs):
-        self._model_name = None
-        if typedef is None:
-            self.typedef = typedef
-        else:
-            if subclassof(typedef, TypeDefinition):
-                typedef = typedef()
-            if instanceof(typedef, TypeDefinition):
-                self.typedef = typedef
-            else:
-                raise TypeError(("Expected {} to be None, instance of "
-                                 "TypeDefinition, or subclass of"
-                                 "TypeDefinition".format(typedef)))
-        super().__init__(**kwargs)
+        Records are unpacked from a :class:`memoryview` of the buffer, so
+        a large ``bytes``, ``bytearray`` or :class:`mmap.mmap` isn't copied
+        before unpacking.  The unpacked values are then loaded with the
+        model's bound load, so each field's typedef converts them as usual.
 
-    @property
-    def model_name(self):
-        """Name of the model's attr that references self"""
-        return self._model_name
+        Parameters
+        ----------
+        model : :class:`~ModelMetaclass`
+            Model of the instances, bound to this engine
+        buffer : bytes-like object
+            Packed records; its length must be a multiple of the record size
+        **kwargs : kwargs
+            Context for the values being loaded
 
-    @model_name.setter
-    def model_name(self, value):
-        if self._model_name is not None:
-            raise AttributeError("{} model_name already set to '{}'".format(
-                self.__class__.__name__, self._model_name))
-        self._model_name = value
+        Returns
+        -------
+        objs : list
+            The loaded instances, in the order they were packed
 
-    def set(self, obj, value):
-        if self._model_name is None:
-            raise AttributeError("Can't set field without binding to model")
-        obj.__dict__[self._model_name] = value
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the model can't be packed, isn't bound to this engine, or
+            the buffer isn't a whole number of records
 
-    def get(self, obj):
+        """
+        record = type(model).record_struct(model)
+        names = [field.model_name for field in model.Meta.fields]
+        with memoryview(buffer) as view:
+            if view.nbytes % record.size:
+                raise DeclareException(
+                    "Buffer of {} bytes isn't a whole number of {} byte "
+                    "{} records".format(view.nbytes, record.size,
+                                        model.__name__))
+            wires = [dict(zip(names, values))
+                     for values in record.iter_unpack(view)]
+        return self.load_many(model, wires, **kwargs)
+
+    def cache_info(self, typedef):
+        """
+        Return cache counters for a memoized typedef.
+
+        See :attr:`TypeDefinition.memoize` for enabling the cache.
+
+        Returns
+        -------
+        info : dict
+            :class:`~CacheInfo` for each memoized function, under ``"load"``
+            and ``"dump"``.  Empty if the typedef isn't memoized.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine
+
+        """
+        try:
+            bound_type = self.bound_types[typedef]
+        except KeyError:
+            raise DeclareException(
+                "Can't find unknown type {}".format(typedef))
+        bound_type = self._uninstrumented.get(typedef, bound_type)
+        info = {}
+        for key in ("load", "dump"):
+            func = getattr(bound_type, key)
+            if isinstance(func, _Memoized):
+                info[key] = func.cache_info()
+        return info
+
+    def intern_info(self, typedef):
+        """
+        Return the intern table counters for an interned typedef.
+
+        See :attr:`TypeDefinition.intern` for enabling interning.
+
+        Returns
+        -------
+        info : :class:`~InternInfo` or None
+            ``None`` if the typedef's loads aren't interned
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine
+
+        """
+        try:
+            bound_type = self.bound_types[typedef]
+        except KeyError:
+            raise DeclareException(
+                "Can't find unknown type {}".format(typedef))
+        load = self._uninstrumented.get(typedef, bound_type).load
+        table = getattr(load, "intern_table", None)
+        return None if table is None else table.intern_info()
+
+    def dump_value(self, value, **kwargs):
+        """
+        Dump a value with the typedef bound for its python type.
+
+        The typedef is found by ``python_type``, walking the MRO of the
+        value's class, so a typedef for a base class also handles its
+        subclasses.  The result is cached per concrete class until the next
+        time a typedef is bound.
+
+        When more than one bound typedef has the same ``python_type``, the
+        one that was registered first is used.
+
+        Parameters
+        ----------
+        value : object
+            The value to dump
+        **kwargs : kwargs
+            Context for the value being dumped
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If no bound typedef handles the value's class
+
+        Example
+        -------
+
+        .. code-block:: python
+
+            payload = [engine.dump_value(value) for value in values]
+
+        """
+        cls = value.__class__
+        try:
+            bound_type = self._python_type_cache[cls]
+        except KeyError:
+            bound_type = self._resolve(
+                self._by_python_type, self._python_type_cache, cls)
+        if bound_type is None:
+            raise DeclareException(
+                "No typedef for python type {}".format(cls))
+        return bound_type.dump(value, **kwargs)
+
+    def load_value(self, value, python_type=None, **kwargs):
+        """
+        Load a value with the typedef bound for a python or backing type.
+
+        When ``python_type`` is given, the typedef is found the same way as
+        :meth:`~TypeEngine.dump_value` would for an instance of
+        ``python_type``.  Otherwise the typedef is found by ``backing_type``,
+        walking the MRO of the value's class.
+
+        Parameters
+        ----------
+        value : object
+            The value to load
+        python_type : type, optional
+            The type to load the value as
+        **kwargs : kwargs
+            Context for the value being loaded
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If no bound typedef handles the python type (or the value's
+            class, when python_type is omitted)
+
+        """
+        if python_type is None:
+            cls = value.__class__
+            index = self._by_backing_type
+            cache = self._backing_type_cache
+        else:
+            cls = python_type
+            index = self._by_python_type
+            cache = self._python_type_cache
+        try:
+            bound_type = cache[cls]
+        except KeyError:
+            bound_type = self._resolve(index, cache, cls)
+        if bound_type is None:
+            raise DeclareException("No typedef for {} type {}".format(
+                "backing" if python_type is None else "python", cls))
+        return bound_type.load(value, **kwargs)
+
+    def _resolve(self, index, cache, cls):
+        """Walk the MRO of cls for an indexed typedef, and cache the result"""
+        bound_type = None
+        for base in getattr(cls, "__mro__", (cls,)):
+            typedef = index.get(base)
+            if typedef is not None:
+                bound_type = self.bound_types[typedef]
+                break
+        cache[cls] = bound_type
+        return bound_type
+
+    def load_many_parallel(self, typedef, values, *, chunk_size=1000,
+                           executor=None, max_workers=None, bind_config=None,
+                           **kwargs):
+        """
+        Load values in chunks across a pool of processes.
+
+        Intended for CPU-heavy typedefs (decompression, decoding, crypto)
+        that are limited by the GIL.  ``values`` is split into lists of
+        ``chunk_size`` and each chunk is loaded with the bound
+        ``load_many`` in a worker process.  Results are returned as a list
+        in input order.
+
+        Each worker registers and binds its own copy of ``typedef`` in a
+        private engine of the same class, so this engine is never changed,
+        even by a thread pool.  The typedef is pickled once per call; it must
+        be picklable (module-level classes are), as must the engine class,
+        the values, the results and any context.  Workers keep the copy, so
+        later chunks and calls reuse it without binding again.
+
+        For small inputs, pickling costs more than the pool saves;
+        ``benchmarks/process_pool.py`` shows where the crossover is.
+
+        Parameters
+        ----------
+        typedef : :class:`~TypeDefinition`
+            The typedef whose bound load_many method should be used
+        values : iterable
+            The values to load
+        chunk_size : int
+            Number of values sent to a worker at a time
+        executor : :class:`concurrent.futures.Executor`, optional
+            Executor to submit chunks to.  By default a new
+            :class:`~concurrent.futures.ProcessPoolExecutor` is used.
+        max_workers : int, optional
+            Passed to the default executor
+        bind_config : dict, optional
+            Config the workers pass to :meth:`~TypeEngine.bind`.  This
+            should match the config used to bind this engine.
+        **kwargs : kwargs
+            Context for the values being loaded.  Changes made to the
+            context by workers are not seen by the caller.
+
+        Returns
+        -------
+        loaded_values : list
+            The loaded values, in the same order as the input values
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine, or binds
+            coroutine functions
+
+        """
+        return self._convert_parallel(
+            "load_many", typedef, values, chunk_size, executor,
+            max_workers, bind_config, kwargs)
+
+    def dump_many_parallel(self, typedef, values, *, chunk_size=1000,
+                           executor=None, max_workers=None, bind_config=None,
+                           **kwargs):
+        """
+        Dump values in chunks across a pool of processes.
+
+        The dump counterpart of :meth:`~TypeEngine.load_many_parallel`; see
+        that method for a description of the parameters.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine, or binds
+            coroutine functions
+
+        """
+        return self._convert_parallel(
+            "dump_many", typedef, values, chunk_size, executor,
+            max_workers, bind_config, kwargs)
+
+    def _convert_parallel(self, method, typedef, values, chunk_size,
+                          executor, max_workers, bind_config, kwargs):
+        self._sync_bound_type(typedef, method.split("_")[0])
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        values = iter(values)
+        chunks = iter(lambda: list(itertools.islice(values, chunk_size)), [])
+        convert = functools.partial(
+            _convert_chunk, type(self), self.namespace,
+            pickle.dumps(typedef), bind_config or {}, method, kwargs)
+
+        own_executor = executor is None
+        if own_executor:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+        try:
+            results = []
+            for chunk in executor.map(convert, chunks):
+                results.extend(chunk)
+            return results
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+    async def aload(self, typedef, value, **kwargs):
+        """
+        Coroutine version of :meth:`~TypeEngine.load`
+
+        Awaits the bound load function if the typedef bound a coroutine
+        function, otherwise calls it directly.  Models are always
+        synchronous: binding one with a field whose typedef binds coroutine
+        functions raises :class:`~DeclareException`.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine
+
+        """
+        try:
+            bound_type = self.bound_types[typedef]
+        except KeyError:
+            raise DeclareException(
+                "Can't load unknown type {}".format(typedef))
+        if bound_type.async_load:
+            return await bound_type.load(value, **kwargs)
+        return bound_type.load(value, **kwargs)
+
+    async def adump(self, typedef, value, **kwargs):
+        """
+        Coroutine version of :meth:`~TypeEngine.dump`
+
+        Awaits the bound dump function if the typedef bound a coroutine
+        function, otherwise calls it directly.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine
+
+        """
+        try:
+            bound_type = self.bound_types[typedef]
+        except KeyError:
+            raise DeclareException(
+                "Can't dump unknown type {}".format(typedef))
+        if bound_type.async_dump:
+            return await bound_type.dump(value, **kwargs)
+        return bound_type.dump(value, **kwargs)
+
+    async def aload_many(self, typedef, values, *, concurrency=None,
+                         **kwargs):
+        """
+        Coroutine version of :meth:`~TypeEngine.load_many`
+
+        For typedefs that bound a coroutine load function, up to
+        ``concurrency`` values are loaded at once (all of them when
+        ``concurrency`` is None) and the results are returned as a list in
+        input order.  If any load raises, the remaining loads are cancelled
+        and the exception is raised.  Sync typedefs use the bound
+        ``load_many`` directly, without creating any tasks.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine
+
+        Example
+        -------
+
+        .. code-block:: python
+
+            class UserRef(TypeDefinition):
+                def bind(self, engine, **config):
+                    async def load(user_id, **kwargs):
+                        return await cache.get(user_id)
+                    return load, self._dump
+
+            users = await engine.aload_many(ref, ids, concurrency=50)
+
+        """
+        try:
+            bound_type = self.bound_types[typedef]
+        except KeyError:
+            raise DeclareException(
+                "Can't load unknown type {}".format(typedef))
+        if bound_type.async_load:
+            return await _gather_bounded(
+                bound_type.load, values, concurrency, kwargs)
+        return _many(bound_type.load, bound_type.load_many)(values, **kwargs)
+
+    async def adump_many(self, typedef, values, *, concurrency=None,
+                         **kwargs):
+        """
+        Coroutine version of :meth:`~TypeEngine.dump_many`
+
+        See :meth:`~TypeEngine.aload_many` for how ``concurrency`` and sync
+        typedefs are handled.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine
+
+        """
+        try:
+            bound_type = self.bound_types[typedef]
+        except KeyError:
+            raise DeclareException(
+                "Can't dump unknown type {}".format(typedef))
+        if bound_type.async_dump:
+            return await _gather_bounded(
+                bound_type.dump, values, concurrency, kwargs)
+        return _many(bound_type.dump, bound_type.dump_many)(values, **kwargs)
+
+    def iter_load(self, typedef, values, *, chunk_size=None, errors="raise",
+                  failures=None, **kwargs):
+        """
+        Lazily load values from any iterable.
+
+        The bound functions for ``typedef`` are looked up once, when
+        iter_load is called, and ``values`` is consumed one item (or one
+        chunk) at a time, so memory use is bounded by ``chunk_size``
+        regardless of the length of the input.
+
+        Parameters
+        ----------
+        typedef : :class:`~TypeDefinition`
+            The typedef whose bound load methods should be used
+        values : iterable
+            The values to load.  Can be a generator, file, queue consumer...
+        chunk_size : int, optional
+            When given, yield lists of up to ``chunk_size`` loaded values,
+            converting each chunk with the bound ``load_many``.  Otherwise
+            yield each loaded value.
+        errors : {"raise", "drop", "collect"}
+            What to do when a value fails to load.  ``"raise"`` stops the
+            stream, ``"drop"`` skips the value, and ``"collect"`` skips the
+            value and appends a :class:`~LoadFailure` to ``failures`` (one
+            per failed field, for models).  ``Meta.lazy`` models are loaded
+            eagerly unless this is ``"raise"``.
+        failures : list, optional
+            Required when ``errors`` is ``"collect"``
+        **kwargs : kwargs
+            Context for the values being loaded
+
+        Returns
+        -------
+        loaded : generator
+            Loaded values, or lists of loaded values when ``chunk_size`` is
+            given
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine, or binds
+            coroutine functions
+
+        Example
+        -------
+
+        .. code-block:: python
+
+            failures = []
+            with open("events.jsonl") as lines:
+                records = map(json.loads, lines)
+                for chunk in engine.iter_load(Event, records, chunk_size=500,
+                                              errors="collect",
+                                              failures=failures):
+                    process(chunk)
+
+        """
+        bound_type = self._sync_bound_type(typedef, "load")
+        load = bound_type.load
+        if errors != "raise":
+            load = _eager(typedef, load)
+        return _iter_convert(
+            load, _many(load, bound_type.load_many),
+            self._has_batch_hook(typedef, "load"), values, chunk_size, errors,
+            failures, kwargs,
+            _load_failures(self, typedef, kwargs))
+
+    def iter_dump(self, typedef, values, *, chunk_size=None, errors="raise",
+                  failures=None, **kwargs):
+        """
+        Lazily dump values from any iterable.
+
+        The dump counterpart of :meth:`~TypeEngine.iter_load`; see that
+        method for a description of the parameters.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the input typedef is not bound to this engine, or binds
+            coroutine functions
+
+        """
+        bound_type = self._sync_bound_type(typedef, "dump")
+        return _iter_convert(
+            bound_type.dump, _many(bound_type.dump, bound_type.dump_many),
+            self._has_batch_hook(typedef, "dump"), values, chunk_size, errors,
+            failures, kwargs)
+
+    def is_compatible(self, typedef):  # pragma: no cover
+        """
+        Returns ``true`` if the typedef is compatible with this engine.
+
+        This function should return ``False`` otherwise.  The default
+        implementation will always return ``True``.
+
+        """
+        return True
+
+    def __contains__(self, typedef):
+        return typedef in self.bound_types
+
+
+_fixed_engines["global"] = TypeEngine("global")
+
+
+# (engine, typedef) bound by _convert_chunk in this (worker) process
+_worker_typedefs = {}
+
+
+def _convert_chunk(engine_cls, namespace, payload, bind_config, method,
+                   kwargs, chunk):
+    """Convert one chunk for TypeEngine.load_many_parallel/dump_many_parallel
+
+    The first time a worker sees the payload, it binds its own copy of the
+    typedef into a private engine of the same class.  The engine for
+    ``namespace`` is never touched: a forked worker's copy may be frozen,
+    and with a thread pool it is the caller's live engine, where binding
+    would also bind the caller's other pending typedefs.
+    """
+    key = (engine_cls, namespace, payload)
+    engine, typedef = _worker_typedefs.get(key, (None, None))
+    if engine is None:
+        engine = engine_cls(str(uuid.uuid4()))
+        typedef = pickle.loads(payload)
+        engine.register(typedef)
+        engine.bind(**bind_config)
+        _worker_typedefs[key] = engine, typedef
+    return list(getattr(engine, method)(typedef, chunk, **kwargs))
+
+
+def _typedef_option(typedef, name):
+    """
+    Read a bind option such as ``memoize`` from a typedef.
+
+    Models are typedefs whose instances are classes, so a field with the
+    same name as the option would shadow it.  Their options are read from
+    the metaclass instead.
+    """
+    if isinstance(typedef, type):
+        return getattr(type(typedef), name)
+    return getattr(typedef, name)
+
+
+class _Memoized:
+    """
+    Bounded cache around a bound load or dump function.
+
+    Results are keyed by the value, its type and any context, so equal
+    values of different types (``1``, ``1.0`` and ``True``) are cached
+    separately.  Calls with an unhashable value or context are passed
+    straight through.  Safe to call
+    from several threads, although counters may be slightly off.
+    """
+    def __init__(self, func, maxsize=128, ttl=None, policy="lru"):
+        if policy not in _cache_policies:
+            raise ValueError("policy must be one of {}, not {!r}".format(
+                _cache_policies, policy))
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("maxsize must be a positive integer or None")
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lru = policy == "lru"
+        self.cache = collections.OrderedDict()
+        self.hits = self.misses = self.evictions = self.bypassed = 0
+
+    def __call__(self, value, **kwargs):
+        try:
+            # Keys with and without context have different lengths
+            if kwargs:
+                key = value, type(value), tuple(sorted(kwargs.items()))
+            else:
+                key = value, type(value)
+            entry = self.cache.get(key, missing)
+        except TypeError:
+            self.bypassed += 1
+            return self.func(value, **kwargs)
+        if entry is not missing:
+            result, expires = entry
+            if expires is None or expires > time.monotonic():
+                self.hits += 1
+                if self.lru:
+                    try:
+                        self.cache.move_to_end(key)
+                    except KeyError:
+                        pass  # Evicted by another thread
+                return result
+            self.cache.pop(key, None)
+            self.evictions += 1
+        self.misses += 1
+        result = self.func(value, **kwargs)
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        self.cache[key] = result, expires
+        if self.maxsize is not None and len(self.cache) > self.maxsize:
+            try:
+                self.cache.popitem(last=False)
+            except KeyError:
+                pass  # Emptied by another thread
+            else:
+                self.evictions += 1
+        return result
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         self.bypassed, len(self.cache), self.maxsize)
+
+
+class _InternTable:
+    """Interned values and counters for a load function; see _interned"""
+    __slots__ = ("values", "maxsize", "hits", "rejected", "bypassed",
+                 "saved")
+
+    def __init__(self, maxsize):
+        self.values = {}
+        self.maxsize = maxsize
+        self.hits = self.rejected = self.bypassed = self.saved = 0
+
+    def intern_info(self):
+        return InternInfo(self.hits, len(self.values), self.rejected,
+                          self.bypassed, self.saved, self.maxsize)
+
+
+def _interned(func, maxsize=1024):
+    """
+    Wrap a bound load function with a bounded intern table.
+
+    A loaded value equal to one already in the table (and of the same type)
+    is replaced by the value in the table, so repeated values share one
+    object.  Once the table is full, new values are returned as loaded.
+    Unhashable values are passed straight through.  A closure rather than
+    a class like :class:`_Memoized`, since it runs on every load.  Safe to
+    call from several threads, although counters may be slightly off.
+    """
+    if maxsize < 1:
+        raise ValueError("maxsize must be a positive integer")
+    table = _InternTable(maxsize)
+    values = table.values
+
+    def load(value, **kwargs):
+        result = func(value, **kwargs)
+        try:
+            interned = values.get(result, missing)
+        except TypeError:
+            table.bypassed += 1
+            return result
+        if interned is missing:
+            if len(values) < maxsize:
+                values[result] = result
+            else:
+                table.rejected += 1
+        # Otherwise equal to a value of another type, such as 1 and True
+        elif type(interned) is type(result):
+            table.hits += 1
+            if interned is not result:
+                table.saved += sys.getsizeof(result)
+                return interned
+        return result
+    functools.update_wrapper(load, func, updated=())
+    load.intern_table = table
+    return load
+
+
+class _OpStats:
+    """Counters and recent latencies for one typedef operation"""
+    __slots__ = ("calls", "errors", "total", "samples")
+
+    def __init__(self, samples):
+        self.samples = collections.deque(maxlen=samples)
+        self.reset()
+
+    def record(self, seconds, failed):
+        self.calls += 1
+        self.errors += failed
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def reset(self):
+        self.calls = self.errors = 0
+        self.total = 0.0
+        self.samples.clear()
+
+    def info(self):
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+        return MetricsInfo(self.calls, self.errors, self.total,
+                           percentile(0.5), percentile(0.9), percentile(0.99))
+
+
+def _timed(func, stats):
+    """Wrap a bound function to record its latency and errors in stats"""
+    timer = time.perf_counter
+    if inspect.iscoroutinefunction(func):
+        async def timed(value, **kwargs):
+            start = timer()
+            failed = True
+            try:
+                result = await func(value, **kwargs)
+                failed = False
+                return result
+            finally:
+                stats.record(timer() - start, failed)
+    else:
+        def timed(value, **kwargs):
+            start = timer()
+            failed = True
+            try:
+                result = func(value, **kwargs)
+                failed = False
+                return result
+            finally:
+                stats.record(timer() - start, failed)
+    return functools.wraps(func, updated=())(timed)
+
+
+def _binds_children(typedef):
+    """True for typedefs whose bind looks up other typedefs in the engine"""
+    return isinstance(typedef, (ModelMetaclass, _Composite))
+
+
+def _many(func, many):
+    """A typedef's batch hook, or a loop over its single-value function"""
+    return _PerItem(func) if many is None else many
+
+
+class _PerItem:
+    """Wrap a single-value load or dump function to convert many values"""
+    __slots__ = ("func",)
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, values, **kwargs):
+        func = self.func
+        return [func(value, **kwargs) for value in values]
+
+
+def _validated(load, validators):
+    """Load function that runs each validator on the value first"""
+    if inspect.iscoroutinefunction(load):
+        async def validated(value, **kwargs):
+            for validate in validators:
+                validate(value)
+            return await load(value, **kwargs)
+    elif len(validators) == 1:
+        validate, = validators
+
+        def validated(value, **kwargs):
+            validate(value)
+            return load(value, **kwargs)
+    else:
+        def validated(value, **kwargs):
+            for validate in validators:
+                validate(value)
+            return load(value, **kwargs)
+    return validated
+
+
+def _validated_many(load_many, validators):
+    """
+    Batch load function that validates every value, in one pass, before
+    calling the typedef's batch hook
+    """
+    def validated(values, **kwargs):
+        values = list(values)
+        for value in values:
+            for validate in validators:
+                validate(value)
+        return load_many(values, **kwargs)
+    return validated
+
+
+def _failure(index, value, exc):
+    return (LoadFailure(index, value, exc),)
+
+
+def _load_failures(engine, typedef, kwargs):
+    """
+    Return a function that explains why a value failed to load.
+
+    For models it loads each field's wire value again, returning a
+    :class:`~LoadFailure` for every field that fails.  This only runs for
+    values that already failed, so values that load don't pay for it.
+    """
+    if not isinstance(typedef, ModelMetaclass):
+        return _failure
+
+    def failures(index, wire, exc):
+        if not isinstance(wire, collections.abc.Mapping):
+            return _failure(index, wire, exc)
+        found = []
+        for field in typedef.Meta.fields:
+            value = wire.get(field.model_name, missing)
+            if value is missing or field.typedef is None:
+                continue
+            try:
+                engine.load(field.typedef, value, **kwargs)
+            except Exception as field_exc:
+                found.append(LoadFailure(
+                    index, value, field_exc, field.model_name))
+        # Failed outside of the field typedefs, such as in Field.set
+        return found or _failure(index, wire, exc)
+    return failures
+
+
+def _eager(typedef, load):
+    """
+    Load function that reads every field of a ``Meta.lazy`` model, so a
+    field that fails to load raises here instead of on first read.  Other
+    typedefs' load functions are returned unchanged.
+    """
+    if not isinstance(typedef, ModelMetaclass) or not getattr(
+            typedef.Meta, "lazy", False):
+        return load
+    fields = typedef.Meta.fields
+
+    def eager(value, **kwargs):
+        obj = load(value, **kwargs)
+        wire = getattr(obj, _LAZY_ATTR).wire
+        for field in fields:
+            if field.model_name in wire:
+                field.get(obj)
+        return obj
+    return eager
+
+
+async def _gather_bounded(func, values, concurrency, kwargs):
+    """Await func for each value with at most ``concurrency`` in flight"""
+    # Only needed here, so plain imports of declare don't pay for asyncio
+    import asyncio
+    if concurrency is not None and concurrency < 1:
+        raise ValueError("concurrency must be a positive integer")
+    values = list(values)
+    results = [None] * len(values)
+    # Workers share one iterator, so only ``concurrency`` tasks are created
+    pending = iter(enumerate(values))
+
+    async def worker():
+        for i, value in pending:
+            results[i] = await func(value, **kwargs)
+
+    n_workers = len(values)
+    if concurrency is not None:
+        n_workers = min(concurrency, n_workers)
+    workers = [asyncio.ensure_future(worker()) for _ in range(n_workers)]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        raise
+    return results
+
+
+def _iter_convert(func, many, batched, values, chunk_size, errors, failures,
+                  kwargs, describe=_failure):
+    """
+    Validate streaming arguments, then return the conversion generator.
+
+    ``batched`` is true when ``many`` is a typedef's batch hook rather than
+    a loop over ``func``.
+
+    ``describe(index, value, exc)`` returns the :class:`~LoadFailure`
+    records collected for a value that failed.
+    """
+    if errors not in _error_modes:
+        raise ValueError("errors must be one of {}, not {!r}".format(
+            _error_modes, errors))
+    if errors == "collect" and failures is None:
+        raise ValueError("errors='collect' requires a failures list")
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+    if errors == "raise":
+        on_failure = None
+    elif errors == "drop":
+        on_failure = _drop_failure
+    else:
+        def on_failure(index, value, exc):
+            failures.extend(describe(index, value, exc))
+    if chunk_size is None:
+        return _iter_items(func, values, on_failure, kwargs)
+    return _iter_chunks(func, many, batched, values, chunk_size, on_failure,
+                        kwargs)
+
+
+def _drop_failure(index, value, exc):
+    pass
+
+
+def _iter_items(func, values, on_failure, kwargs):
+    if on_failure is None:
+        for value in values:
+            yield func(value, **kwargs)
+        return
+    for i, value in enumerate(values):
+        try:
+            result = func(value, **kwargs)
+        except Exception as exc:
+            on_failure(i, value, exc)
+        else:
+            yield result
+
+
+def _iter_chunks(func, many, batched, values, chunk_size, on_failure,
+                 kwargs):
+    values = iter(values)
+    offset = 0
+    while True:
+        chunk = list(itertools.islice(values, chunk_size))
+        if not chunk:
+            return
+        if on_failure is None:
+            yield many(chunk, **kwargs)
+        else:
+            results = None
+            # Without a batch hook there's nothing to gain from trying the
+            # whole chunk first, so convert each value once
+            if batched:
+                try:
+                    results = many(chunk, **kwargs)
+                except Exception:
+                    # Retry one at a time to isolate the failing values
+                    pass
+            if results is None:
+                results = []
+                for i, value in enumerate(chunk, offset):
+                    try:
+                        results.append(func(value, **kwargs))
+                    except Exception as exc:
+                        on_failure(i, value, exc)
+            if len(results):
+                yield results
+        offset += len(chunk)
+
+
+class TypeDefinition:
+    """
+    Translates between python types and backend/storage/transport types
+
+    A single TypeDefinition can be used for multiple TypeEngines, by
+    implementing :meth:`~TypeDefinition.bind` and returning different
+    (load, dump) function tuples for each engine.
+
+    For TypeDefinitions that are loaded/dumped the same for every engine,
+    just implement :meth:`~TypeDefinition._load` and
+    :meth:`~TypeDefinition._dump`.
+
+    """
+    python_type = None
+    backing_type = None
+
+    # Optional batch functions; see bind_many
+    _load_many = None
+    _dump_many = None
+
+    #: Memoize the bound load and dump functions.  ``True`` for the default
+    #: cache, or a dict of options: ``maxsize`` (default 128, ``None`` for
+    #: unbounded), ``ttl`` in seconds (default ``None``, never expires) and
+    #: ``policy`` (``"lru"`` or ``"fifo"``).  When ``None``, the ``memoize``
+    #: key of the engine's bind config is used instead.  Only for typedefs
+    #: whose conversions are pure; coroutine functions and batch hooks are
+    #: never memoized.  See :meth:`TypeEngine.cache_info`.
+    memoize = None
+
+    #: :mod:`struct` format character used to pack dumped values with
+    #: :meth:`TypeEngine.pack_many`, such as ``"i"`` or ``"f"``.  When
+    #: ``None``, ``int``, ``float`` and ``bool`` backing types are packed as
+    #: ``"q"``, ``"d"`` and ``"?"``, and other backing types can't be packed.
+    struct_format = None
+
+    #: Functions called with each value before it is loaded, which raise
+    #: when the value is invalid.  They are combined with the bound load
+    #: function when the typedef is bound, so validating doesn't take a
+    #: separate pass over the values.  A ``load_many`` batch hook can't be
+    #: split up that way, so its values are validated in one pass first.
+    validators = ()
+
+    #: Intern the results of the bound load function, so equal loaded
+    #: values share one object.  ``True`` for the default table, or a dict
+    #: of options: ``maxsize`` (default 1024), the number of distinct values
+    #: kept.  When ``None``, the ``intern`` key of the engine's bind config
+    #: is used instead.  For typedefs that load a few distinct immutable
+    #: values over and over, such as enums; coroutine functions and batch
+    #: hooks are never interned.  See :meth:`TypeEngine.intern_info`.
+    intern = None
+
+    def bind(self, engine, **config):
+        """
+        Return a pair of (load, dump) functions for a specific engine.
+
+        Some Types will load and dump values depending on certain config, or
+        for different :class:`~TypeEngine`.
+
+        By default, this function will return the functions
+        :meth:`~TypeDefinition.load` and :meth:`~TypeDefinition._dump`.
+
+        The default :meth:`~TypeDefintion._load` and
+        :meth:`~TypeDefintion._dump` functions simply return the input value.
+
+        Parameters
+        ----------
+        engine : :class:`~TypeEngine`
+            The engine that will save these load, dump functions
+        config : dictionary
+            Optional configuration for creating the functions.
+
+        Returns
+        -------
+        (load, dump) : (func, func) tuple
+            Each function takes a value and context, and returns a single
+            value.  Either function may be a coroutine function (for example
+            when conversion needs I/O); use :meth:`TypeEngine.aload` and
+            :meth:`TypeEngine.adump` to await the result.
+        """
+        return self._load, self._dump
+
+    def bind_many(self, engine, **config):
+        """
+        Return a pair of (load_many, dump_many) functions for an engine.
+
+        Batch functions take an iterable of values and context, and return
+        a sequence of converted values in the same order.  They let a
+        typedef convert a whole column at once, with a list comprehension or
+        a vectorized library such as NumPy.
+
+        By default, this function will return :attr:`_load_many` and
+        :attr:`_dump_many`, which are ``None`` unless a subclass implements
+        them.  The engine falls back to calling the single-value function
+        from :meth:`~TypeDefinition.bind` once per item for either function
+        that is ``None``.
+
+        Parameters
+        ----------
+        engine : :class:`~TypeEngine`
+            The engine that will save these load_many, dump_many functions
+        config : dictionary
+            Optional configuration for creating the functions.
+
+        Returns
+        -------
+        (load_many, dump_many) : (func, func) tuple
+            Each function (or ``None``) takes values and context, and returns
+            a sequence of values
+        """
+        return self._load_many, self._dump_many
+
+    def _register(self, engine):
+        """Called when the type is registered with an engine."""
+        pass
+
+    def _load(self, value, **kwargs):
+        """
+        Engine-agnostic load function.  Implement this method for any
+        TypeDefinition whose load function does not depend on the TypeEngine
+        being used to load it.
+
+        NOTE: This will not be available at runtime -
+        TypeDefinitionMetaclass hides the reference at runtime to reduce the
+        chance of incorrectly using an engine-agnostic load method when the
+        TypeDefinition prefers an engine-specific load method.
+
+        By default, returns :attr:`value` unchanged.
+
+        """
+        return value
+
+    def _dump(self, value, **kwargs):
+        """
+        Engine-agnostic dump function.  Implement this method for any
+        TypeDefinition whose dump function does not depend on the TypeEngine
+        being used to dump it.
+
+        NOTE: This will not be available at runtime -
+        TypeDefinitionMetaclass hides the reference at runtime to reduce the
+        chance of incorrectly using an engine-agnostic dump method when the
+        TypeDefinition prefers an engine-specific dump method.
+
+        By default, returns :attr:`value` unchanged.
+
+        """
+        return value
+
+
+def subclassof(obj, classinfo):
+    """Wrap issubclass to only return True/False"""
+    try:
+        return issubclass(obj, classinfo)
+    except TypeError:
+        return False
+
+
+def instanceof(obj, classinfo):
+    """Wrap isinstance to only return True/False"""
+    try:
+        return isinstance(obj, classinfo)
+    except TypeError:  # pragma: no cover
+        # No coverage since we never call this without a class,
+        # type, or tuple of classes, types, or such typles.
+        return False
+
+
+def _child_functions(engine, typedef, config):
+    """
+    Return the (load, dump) functions of a typedef used by another
+    typedef's bind.
+
+    A child still waiting to be bound is bound first.  A child that is
+    being bound further up the stack (a cycle) has no functions yet, so
+    they're looked up on first call instead (see :func:`_late_bound`).
+    """
+    if typedef in engine.unbound_types:
+        engine.unbound_types.remove(typedef)
+        engine._bind(typedef, config)
+    bound_type = engine._uninstrumented.get(
+        typedef, engine.bound_types.get(typedef))
+    if bound_type is None:
+        return (_late_bound(engine, typedef, "load"),
+                _late_bound(engine, typedef, "dump"))
+    if bound_type.async_load or bound_type.async_dump:
+        raise DeclareException(
+            "Can't nest typedef {} with coroutine functions".format(typedef))
+    # Never keep metrics wrappers, which outlive disable_metrics
+    return bound_type.load, bound_type.dump
+
+
+def _late_bound(engine, typedef, operation):
+    """
+    Call a typedef's bound load or dump function, looked up on first call.
+
+    Until the typedef is bound, calls go through :meth:`TypeEngine.load` or
+    :meth:`TypeEngine.dump`, which raise :class:`DeclareException`.
+    """
+    func = None
+
+    def call(value, **kwargs):
+        nonlocal func
+        if func is None:
+            bound_type = engine._uninstrumented.get(
+                typedef, engine.bound_types.get(typedef))
+            if bound_type is None:
+                return getattr(engine, operation)(typedef, value, **kwargs)
+            func = getattr(bound_type, operation)
+        return func(value, **kwargs)
+    return call
+
+
+class _Composite(TypeDefinition):
+    """
+    Base for typedefs that convert values with other (child) typedefs.
+
+    Children are given as a :class:`~TypeDefinition` subclass or instance,
+    or a model.  For a model that isn't defined yet, such as the model a
+    field belongs to, pass a function that returns it; the function is
+    called when the composite is first registered.
+
+    Registering a composite registers its children.  Binding it looks up
+    the children's bound functions once, so converting a value calls them
+    directly without looking anything up in the engine.  Children that are
+    part of a cycle are looked up once, on first use; see
+    :func:`_child_functions`.
+    """
+    # Loaded values are mutable containers
+    memoize = False
+
+    def __init__(self, *children):
+        for child in children:
+            if child is not None and not _deferred_typedef(child):
+                _typedef_instance(child)
+        self._children = children
+        self._resolved = None
+
+    @property
+    def children(self):
+        """Child typedefs (or ``None``), with functions resolved"""
+        if self._resolved is None:
+            self._resolved = tuple(
+                child if child is None else _typedef_instance(
+                    child() if _deferred_typedef(child) else child)
+                for child in self._children)
+        return self._resolved
+
+    def _register(self, engine):
+        for child in self.children:
+            if child is not None:
+                engine.register(child)
+
+
+def _deferred_typedef(obj):
+    """True for a function that returns a typedef, such as ``lambda: Node``"""
+    return callable(obj) and not isinstance(obj, (type, TypeDefinition))
+
+
+def _typedef_instance(typedef):
+    """Instantiate a TypeDefinition subclass; pass through instances"""
+    if subclassof(typedef, TypeDefinition):
+        typedef = typedef()
+    if not instanceof(typedef, TypeDefinition):
+        raise TypeError("Expected {} to be an instance or subclass of "
+                        "TypeDefinition".format(typedef))
+    return typedef
+
+
+class List(_Composite):
+    """
+    A list of values converted by one typedef.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        class Node(metaclass=ModelMetaclass):
+            value = Field(typedef=Integer)
+            children = Field(typedef=List(lambda: Node))
+
+    """
+    python_type = list
+    backing_type = list
+
+    def __init__(self, typedef):
+        super().__init__(typedef)
+
+    def bind(self, engine, **config):
+        load_item, dump_item = _child_functions(
+            engine, self.children[0], config)
+
+        def load(values, **kwargs):
+            return [load_item(value, **kwargs) for value in values]
+
+        def dump(values, **kwargs):
+            return [dump_item(value, **kwargs) for value in values]
+        return load, dump
+
+
+class Map(_Composite):
+    """
+    A dict whose values are converted by one typedef.
+
+    Keys are passed through unchanged unless a ``key`` typedef is given.
+    """
+    python_type = dict
+    backing_type = dict
+
+    def __init__(self, typedef, key=None):
+        super().__init__(typedef, key)
+
+    def bind(self, engine, **config):
+        value_typedef, key_typedef = self.children
+        load_value, dump_value = _child_functions(
+            engine, value_typedef, config)
+        if key_typedef is None:
+            def load(values, **kwargs):
+                return {key: load_value(value, **kwargs)
+                        for key, value in values.items()}
+
+            def dump(values, **kwargs):
+                return {key: dump_value(value, **kwargs)
+                        for key, value in values.items()}
+            return load, dump
+
+        load_key, dump_key = _child_functions(engine, key_typedef, config)
+
+        def load(values, **kwargs):
+            return {load_key(key, **kwargs): load_value(value, **kwargs)
+                    for key, value in values.items()}
+
+        def dump(values, **kwargs):
+            return {dump_key(key, **kwargs): dump_value(value, **kwargs)
+                    for key, value in values.items()}
+        return load, dump
+
+
+class Optional(_Composite):
+    """
+    A value converted by one typedef, or ``None`` in either direction.
+
+    Has no ``python_type`` or ``backing_type``, since its values aren't
+    always of its typedef's types: it isn't used by
+    :meth:`~TypeEngine.dump_value` or :meth:`~TypeEngine.load_value`, and
+    is stored in ``object`` columns by :class:`~ColumnBatch`.
+    """
+    def __init__(self, typedef):
+        super().__init__(typedef)
+
+    def bind(self, engine, **config):
+        load_value, dump_value = _child_functions(
+            engine, self.children[0], config)
+
+        def load(value, **kwargs):
+            return None if value is None else load_value(value, **kwargs)
+
+        def dump(value, **kwargs):
+            return None if value is None else dump_value(value, **kwargs)
+        return load, dump
+
+
+# Attribute holding the _LazyWire of a Meta.lazy model instance
+_LAZY_ATTR = "_declare_lazy"
+
+
+class _LazyWire:
+    """
+    Raw wire values of a Meta.lazy model instance, loaded on first get.
+
+    Never changed once created, since copies of the instance share it.
+    Loaded values are cached on the instance, which takes precedence, and
+    deleting a field gives the instance a new wire without that value.
+    """
+    __slots__ = ("wire", "loaders", "kwargs")
+
+    def __init__(self, wire, loaders, kwargs):
+        self.wire = wire
+        self.loaders = loaders
+        self.kwargs = kwargs
+
+    def load(self, name):
+        """Load a raw value, or return ``missing``"""
+        value = self.wire.get(name, missing)
+        if value is not missing:
+            load = self.loaders[name]
+            if load is not None:
+                value = load(value, **self.kwargs)
+        return value
+
+    def without(self, name):
+        """Copy without the raw value for ``name``"""
+        wire = dict(self.wire)
+        del wire[name]
+        return _LazyWire(wire, self.loaders, self.kwargs)
+
+
+# Attribute holding the set of changed field names for Meta.track_changes
+_CHANGES_ATTR = "_declare_changes"
+
+
+def _mark_changed(obj, name):
+    changed = getattr(obj, _CHANGES_ATTR, None)
+    if changed is None:
+        changed = set()
+        setattr(obj, _CHANGES_ATTR, changed)
+    changed.add(name)
+
+
+def changes(obj):
+    """
+    Return the names of fields set or deleted since changes were cleared.
+
+    Only models with ``Meta.track_changes`` record changes; for any other
+    object this is always empty.  Loading an instance through an engine
+    doesn't count as a change.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        user.email = "new@example.com"
+        assert changes(user) == {"email"}
+        write(engine.dump_changes(user))
+        clear_changes(user)
+
+    """
+    return frozenset(getattr(obj, _CHANGES_ATTR, None) or ())
+
+
+def clear_changes(obj):
+    """Forget the changes recorded for ``obj``, for example after a write"""
+    changed = getattr(obj, _CHANGES_ATTR, None)
+    if changed:
+        changed.clear()
+
+
+def _slot_name(model_name):
+    """Name of the slot that stores a field's value for Meta.slots models"""
+    return "_declare_" + model_name
+
+
+class Field:
+    def __init__(self, *, typedef=None, **kwargs):
+        self._model_name = None
+        # Set by ModelMetaclass when the model uses Meta.slots
+        self._slot = None
+        # Set by ModelMetaclass when the model uses Meta.track_changes
+        self._tracked = False
+        if typedef is None:
+            self.typedef = typedef
+        else:
+            if subclassof(typedef, TypeDefinition):
+                typedef = typedef()
+            if instanceof(typedef, TypeDefinition):
+                self.typedef = typedef
+            else:
+                raise TypeError(("Expected {} to be None, instance of "
+                                 "TypeDefinition, or subclass of"
+                                 "TypeDefinition".format(typedef)))
+        super().__init__(**kwargs)
+
+    @property
+    def model_name(self):
+        """Name of the model's attr that references self"""
+        return self._model_name
+
+    @model_name.setter
+    def model_name(self, value):
+        if self._model_name is not None:
+            raise AttributeError("{} model_name already set to '{}'".format(
+                self.__class__.__name__, self._model_name))
+        self._model_name = value
+
+    def _finalize(self, obj, action):
+        """Finalize a Meta.deferred model on first use, or raise"""
+        for cls in type(obj).__mro__:
+            if isinstance(cls, ModelMetaclass):
+                type(cls).finalize(cls)
         if self._model_name is None:
-            raise AttributeError("Can't get field without binding to model")
+            raise AttributeError(
+                "Can't {} field without binding to model".format(action))
+
+    def set(self, obj, value):
+        if self._model_name is None:
+            self._finalize(obj, "set")
+        if self._slot is not None:
+            setattr(obj, self._slot, value)
+        else:
+            obj.__dict__[self._model_name] = value
+        if self._tracked:
+            _mark_changed(obj, self._model_name)
+
+    def get(self, obj):
+        if self._model_name is None:
+            self._finalize(obj, "get")
         try:
+            if self._slot is not None:
+                return getattr(obj, self._slot)
             return obj.__dict__[self._model_name]
-        except KeyError:
+        except (KeyError, AttributeError):
+            pass
+        # Only Meta.lazy instances have raw values to fall back on
+        lazy = getattr(obj, _LAZY_ATTR, None)
+        value = missing if lazy is None else lazy.load(self._model_name)
+        if value is missing:
             raise AttributeError("'{}' has no attribute '{}'".format(
                 obj.__class__, self._model_name))
+        # Cache without going through set, since loading isn't a change
+        if self._slot is not None:
+            setattr(obj, self._slot, value)
+        else:
+            obj.__dict__[self._model_name] = value
+        return value
 
     def delete(self, obj):
         if self._model_name is None:
-            raise AttributeError("Can't delete field without binding to model")
+            self._finalize(obj, "delete")
+        deleted = True
         try:
-            del obj.__dict__[self._model_name]
-        except KeyError:
+            if self._slot is not None:
+                delattr(obj, self._slot)
+            else:
+                del obj.__dict__[self._model_name]
+        except (KeyError, AttributeError):
+            deleted = False
+        lazy = getattr(obj, _LAZY_ATTR, None)
+        if lazy is not None and self._model_name in lazy.wire:
+            setattr(obj, _LAZY_ATTR, lazy.without(self._model_name))
+            deleted = True
+        if not deleted:
             raise AttributeError("'{}' has no attribute '{}'".format(
                 obj.__class__, self._model_name))
+        if self._tracked:
+            _mark_changed(obj, self._model_name)
 
     # Descriptor Protocol
     # To override, use set, get, delete above
@@ -462,16 +2545,340 @@ def index(objects, attr):
     assert by_email['two@people.com'] is people[1]
 
     """
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        return {getattr(obj, attr): obj for obj in objects}
+    return {getattr(obj, attr): obj for obj in objects}
+
+
+_FieldCode = collections.namedtuple(
+    "_FieldCode", ["load", "dump", "store", "read", "missing_exc", "loader",
+                   "uses_dict", "calls_set"])
+
+
+def _field_code(i, field, engine, namespace, value="value"):
+    """
+    Snippets of generated code for converting the ``i``-th field of a model.
+
+    ``load`` is an expression that loads the variable named by ``value``,
+    and ``dump`` one that dumps the variable ``value``.  ``store`` is a
+    statement that sets the loaded value on ``obj``, and ``read`` is an
+    expression that gets the field's value from ``obj``, raising
+    ``missing_exc`` if it isn't set.  ``loader`` loads a single raw value,
+    for ``Meta.lazy`` models.  Code that uses ``storage`` (``uses_dict``)
+    must first assign ``storage = obj.__dict__``.  Code that calls an
+    overridden :meth:`Field.set` (``calls_set``) records changes for
+    ``Meta.track_changes`` models.
+
+    The field, its typedef and any inlined functions are added to
+    ``namespace`` under names ending in ``_<i>``.
+    """
+    name = repr(field.model_name)
+    typedef = field.typedef
+    namespace["field_{}".format(i)] = field
+    namespace["typedef_{}".format(i)] = typedef
+
+    if typedef is None:
+        load, dump = value, "value"
+        loader = None
+    elif typedef in engine.bound_types:
+        # Never inline metrics wrappers, which outlive disable_metrics
+        bound_type = engine._uninstrumented.get(
+            typedef, engine.bound_types[typedef])
+        namespace["load_{}".format(i)] = bound_type.load
+        namespace["dump_{}".format(i)] = bound_type.dump
+        load = "load_{}({}, **kwargs)".format(i, value)
+        dump = "dump_{}(value, **kwargs)".format(i)
+        loader = bound_type.load
+    else:
+        load = "engine.load(typedef_{}, {}, **kwargs)".format(i, value)
+        dump = "engine.dump(typedef_{}, value, **kwargs)".format(i)
+        loader = functools.partial(engine.load, typedef)
+
+    uses_dict = calls_set = False
+    if type(field).set is not Field.set:
+        store = "field_{}.set(obj, {})".format(i, load)
+        calls_set = True
+    elif field._slot is not None:
+        store = "obj.{} = {}".format(field._slot, load)
+    else:
+        store = "storage[{}] = {}".format(name, load)
+        uses_dict = True
+    missing_exc = "AttributeError"
+    if type(field).get is not Field.get:
+        read = "field_{}.get(obj)".format(i)
+    elif field._slot is not None:
+        read = "obj." + field._slot
+    else:
+        read, missing_exc = "storage[{}]".format(name), "KeyError"
+        uses_dict = True
+    return _FieldCode(load, dump, store, read, missing_exc, loader,
+                      uses_dict, calls_set)
+
+
+def _reset_changes(model, calls_set, indent):
+    """
+    Generated lines that forget the changes recorded while loading ``obj``.
+
+    Overridden set methods (``calls_set``) record changes for
+    ``Meta.track_changes`` models, but loading isn't one.
+    """
+    if calls_set and getattr(model.Meta, "track_changes", False):
+        return [indent + "obj.{} = None".format(_CHANGES_ATTR)]
+    return []
+
+
+def _compile_model(model, engine, config):
+    """
+    Generate a specialized (load_model, dump_model) pair for a model.
+
+    The load/dump functions already bound to ``engine`` for each field's
+    typedef are inlined into the generated code, so converting a model
+    doesn't look up ``engine.bound_types`` per field.  Fields whose typedef
+    isn't bound yet (for example, a model that references itself) fall back
+    to :meth:`TypeEngine.load` and :meth:`TypeEngine.dump` at call time.
+
+    ``load_model`` takes a wire dict keyed by each field's ``model_name``
+    and creates an instance without calling ``__init__``.  ``dump_model``
+    returns a new wire dict.  Missing values are skipped in both directions.
+    Fields that override :meth:`Field.set` or :meth:`Field.get` are stored
+    and read through those methods instead of the instance ``__dict__`` (or
+    slot, for ``Meta.slots`` models).
+
+    For ``Meta.lazy`` models, ``load_model`` only attaches a
+    :class:`_LazyWire` to the instance, and ``dump_model`` passes through
+    raw values for fields that were never loaded or set.
+
+    When ``config`` has a ``model_cache`` directory, the compiled code is
+    loaded from and saved to that directory (see :func:`_cached_code`).
+    """
+    lazy = getattr(model.Meta, "lazy", False)
+    loaders = {}
+    namespace = {"model": model, "engine": engine, "loaders": loaders,
+                 "LazyWire": _LazyWire}
+    load_lines = [
+        "def load_model(wire, **kwargs):",
+        "    obj = model.__new__(model)"]
+    dump_lines = [
+        "def dump_model(obj, **kwargs):",
+        "    wire = {}"]
+    if lazy:
+        load_lines.append(
+            "    obj.{} = LazyWire(dict(wire), loaders, kwargs)".format(
+                _LAZY_ATTR))
+        dump_lines.extend([
+            "    lazy = getattr(obj, {!r}, None)".format(_LAZY_ATTR),
+            "    raw = {} if lazy is None else lazy.wire"])
+    uses_dict = calls_set = False
+
+    for i, field in enumerate(model.Meta.fields):
+        name = repr(field.model_name)
+        code = _field_code(i, field, engine, namespace)
+        loaders[field.model_name] = code.loader
+        uses_dict = uses_dict or code.uses_dict
+        calls_set = calls_set or (code.calls_set and not lazy)
+
+        if not lazy:
+            load_lines.extend([
+                "    try:",
+                "        value = wire[{}]".format(name),
+                "    except KeyError:",
+                "        pass",
+                "    else:",
+                "        " + code.store])
+        dump_lines.extend([
+            "    try:",
+            "        value = " + code.read,
+            "    except {}:".format(code.missing_exc)])
+        if lazy:
+            dump_lines.extend([
+                "        if {} in raw:".format(name),
+                "            wire[{0}] = raw[{0}]".format(name)])
+        else:
+            dump_lines.append("        pass")
+        dump_lines.extend([
+            "    else:",
+            "        wire[{}] = {}".format(name, code.dump)])
+
+    if uses_dict:
+        if not lazy:
+            load_lines.insert(2, "    storage = obj.__dict__")
+        dump_lines.insert(1, "    storage = obj.__dict__")
+    load_lines.extend(_reset_changes(model, calls_set, "    "))
+    load_lines.append("    return obj")
+    dump_lines.append("    return wire")
+    source = "\n".join(load_lines + dump_lines) + "\n"
+    filename = "<declare: {}.{}>".format(model.__module__, model.__qualname__)
+    directory = config.get("model_cache")
+    if directory is None:
+        code = compile(source, filename, "exec")
+    else:
+        key = _model_cache_key(model, engine, config)
+        code = _cached_code(directory, key, source, filename)
+    exec(code, namespace)
+    return namespace["load_model"], namespace["dump_model"]
+
+
+def _compile_rows(model, engine):
+    """
+    Generate (load_rows, dump_rows) generator functions for a model.
+
+    ``load_rows`` unpacks each row into one value per field, in
+    ``Meta.fields`` order, and loads them into a new instance without
+    building a wire dict.  ``None`` leaves the field unset, unless the
+    field's typedef is :class:`~Optional`: then ``None`` is loaded, so a
+    field holding ``None`` round-trips.  ``dump_rows`` yields a tuple for
+    each instance, with ``None`` for unset fields.  Rows are always loaded
+    eagerly, even for ``Meta.lazy`` models.
+    """
+    namespace = {"model": model, "engine": engine}
+    fields = model.Meta.fields
+    names = ["v{}".format(i) for i in range(len(fields))]
+    # "v0, v1, " so a single field still makes a tuple
+    targets = "".join(name + ", " for name in names)
+    load_lines = [
+        "def load_rows(rows, **kwargs):",
+        "    for row in rows:",
+        "        ({}) = row".format(targets),
+        "        obj = model.__new__(model)"]
+    dump_lines = [
+        "def dump_rows(objs, **kwargs):",
+        "    for obj in objs:"]
+    uses_dict = calls_set = False
+    for i, field in enumerate(fields):
+        code = _field_code(i, field, engine, namespace, value=names[i])
+        uses_dict = uses_dict or code.uses_dict
+        calls_set = calls_set or code.calls_set
+        if isinstance(field.typedef, Optional):
+            load_lines.append("        " + code.store)
+        else:
+            load_lines.extend([
+                "        if {} is not None:".format(names[i]),
+                "            " + code.store])
+        dump_lines.extend([
+            "        try:",
+            "            value = " + code.read,
+            "        except {}:".format(code.missing_exc),
+            "            {} = None".format(names[i]),
+            "        else:",
+            "            {} = {}".format(names[i], code.dump)])
+    if uses_dict:
+        load_lines.insert(4, "        storage = obj.__dict__")
+        dump_lines.insert(2, "        storage = obj.__dict__")
+    load_lines.extend(_reset_changes(model, calls_set, "        "))
+    load_lines.append("        yield obj")
+    dump_lines.append("        yield ({})".format(targets))
+    source = "\n".join(load_lines + dump_lines) + "\n"
+    filename = "<declare rows: {}.{}>".format(
+        model.__module__, model.__qualname__)
+    exec(compile(source, filename, "exec"), namespace)
+    return namespace["load_rows"], namespace["dump_rows"]
+
+
+def _qualified_name(obj):
+    """module.qualname of a class, or of an instance's class"""
+    cls = obj if isinstance(obj, type) else type(obj)
+    return "{}.{}".format(cls.__module__, cls.__qualname__)
+
+
+def _model_cache_key(model, engine, config):
+    """
+    Hash of a model's fields (names, field and typedef classes, in order),
+    the engine namespace and the bind config
+    """
+    fields = tuple(
+        (field.model_name, _qualified_name(field),
+         None if field.typedef is None else _qualified_name(field.typedef))
+        for field in model.Meta.fields)
+    config = sorted((key, repr(value)) for key, value in config.items()
+                    if key != "model_cache")
+    schema = repr((_qualified_name(model), fields, engine.namespace, config))
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()
+
+
+def _cached_code(directory, key, source, filename):
+    """
+    Return the compiled code for a model's source, using a cache directory.
+
+    Entries are stored as ``<key>.declare`` and hold the interpreter's
+    bytecode magic number, the declare version and a hash of the generated
+    source next to the code object.  An entry that can't be read or doesn't
+    match all three is stale, and is recompiled and replaced.  Entries are
+    written to a temporary file that is then renamed over the old entry,
+    so processes sharing the directory never read a partial entry.
+    """
+    path = os.path.join(directory, key + ".declare")
+    header = (importlib.util.MAGIC_NUMBER, __version__,
+              hashlib.sha256(source.encode("utf-8")).hexdigest())
+    try:
+        with open(path, "rb") as f:
+            *cached_header, code = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    else:
+        if tuple(cached_header) == header:
+            return code
+    code = compile(source, filename, "exec")
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            marshal.dump(header + (code,), f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return code
+
+
+class _ModelType:
+    """A model's python_type is the model class itself"""
+    def __get__(self, cls, metaclass=None):
+        if cls is None:
+            return self
+        return cls
 
 
 class ModelMetaclass(type, TypeDefinition):
     """
     Track the order that ``Field`` attributes are declared, and
     insert a Meta object (class) in the class
+
+    When ``Meta.slots`` is true, ``__slots__`` is generated from the
+    declared fields and each field stores its value in a slot instead of the
+    instance ``__dict__``.  Any ``__slots__`` already in the class body are
+    kept.  Instances only lose their ``__dict__`` (and weakref support) if
+    every base class also uses ``__slots__``.
+
+    When ``Meta.lazy`` is true, the load function generated by
+    :meth:`~ModelMetaclass.bind` keeps a copy of the wire dict on the
+    instance instead of converting every field.  Each field is loaded with
+    the engine's bound function the first time it is read, then cached on the
+    instance.  Dumping an instance passes raw values through unchanged for
+    fields that were never read or set.  Useful for wide models where only a
+    few fields are read per instance.
+
+    When ``Meta.track_changes`` is true, setting or deleting a field records
+    its name on the instance.  :func:`changes` returns the recorded names,
+    :meth:`TypeEngine.dump_changes` dumps only those fields, and
+    :func:`clear_changes` resets them.  Models without the option only pay
+    for a flag check in :meth:`Field.set` and :meth:`Field.delete`.
+
+    When ``Meta.deferred`` is true, naming the fields and populating
+    ``Meta.fields`` is put off until the model is first used (see
+    :meth:`~ModelMetaclass.finalize`).  Useful to cut import time when a
+    service defines many models but only uses a few of them.
+
+    Models are typedefs too.  Registering a model with a
+    :class:`~TypeEngine` registers the typedef of each of its fields, and
+    binding the model generates a load/dump pair specialized for that
+    engine (see :meth:`~ModelMetaclass.bind`).  A model's ``python_type``
+    is the model class and its ``backing_type`` is :class:`dict`.
     """
+    # Non-data descriptor, so a class attribute named python_type still wins
+    python_type = _ModelType()
+    backing_type = dict
+    # Instances are mutable, so never reuse a cached dump or share a load
+    memoize = False
+    intern = False
+
     @classmethod
     def __prepare__(mcs, name, bases):
         """Returns an OrderedDict so attribute order is preserved"""
@@ -488,20 +2895,690 @@ class ModelMetaclass(type, TypeDefinition):
         if not isinstance(Meta, type):
             raise TypeError("Expected `Meta` to be a class object")
 
+        slots = getattr(Meta, "slots", False)
+        if slots:
+            existing = attrs.get("__slots__", ())
+            if isinstance(existing, str):
+                existing = (existing,)
+            attrs["__slots__"] = tuple(existing) + tuple(
+                _slot_name(key) for key, attr in attrs.items()
+                if isinstance(attr, Field))
+            if getattr(Meta, "lazy", False):
+                attrs["__slots__"] += (_LAZY_ATTR,)
+            if getattr(Meta, "track_changes", False):
+                attrs["__slots__"] += (_CHANGES_ATTR,)
+
         cls = super().__new__(mcs, name, bases, attrs)
+        if not getattr(Meta, "deferred", False):
+            type(cls).finalize(cls)
+        return cls
 
-        # Load and index fields by name
-        # ----------------------------------------------------------
-        fields = []
-        for name, attr in attrs.items():
-            if isinstance(attr, Field):
-                fields.append(attr)
-                # This will raise AttributeError if the field's
-                # name is already set
-                with warnings.catch_warnings():
-                    warnings.simplefilter("ignore")
+    def finalize(cls):
+        """
+        Name each field and populate ``Meta.fields`` and
+        ``Meta.fields_by_model_name``.
+
+        Called when the class is created, unless ``Meta.deferred`` is true.
+        Deferred models are finalized on first use: registering or binding
+        the model, creating a :class:`~ColumnBatch`, or getting, setting or
+        deleting a field on an instance.  Call this directly before reading
+        ``Meta.fields`` of a deferred model that hasn't been used yet, as
+        ``ModelMetaclass.finalize(Model)`` if a field is named ``finalize``.
+        Finalizing a model more than once does nothing.
+
+        Raises
+        ------
+        exc : :class:`AttributeError`
+            If a field is already part of another model
+        """
+        Meta = cls.Meta
+        if "fields" in Meta.__dict__:
+            return
+        with _finalize_lock:
+            if "fields" in Meta.__dict__:
+                return
+            slots = getattr(Meta, "slots", False)
+            tracked = getattr(Meta, "track_changes", False)
+            fields = []
+            for name, attr in cls.__dict__.items():
+                if isinstance(attr, Field):
+                    fields.append(attr)
+                    # This will raise AttributeError if the field's
+                    # name is already set
                     attr.model_name = name
-        Meta.fields_by_model_name = index(fields, 'model_name')
-        Meta.fields = fields
+                    if slots:
+                        attr._slot = _slot_name(name)
+                    attr._tracked = tracked
+            Meta.fields_by_model_name = index(fields, 'model_name')
+            # Set last, since it marks the model as finalized
+            Meta.fields = fields
+
+    def _register(cls, engine):
+        """Register the typedef of each field with the engine."""
+        type(cls).finalize(cls)
+        for field in cls.Meta.fields:
+            if field.typedef is not None:
+                engine.register(field.typedef)
+
+    def bind(cls, engine, **config):
+        """
+        Return a (load, dump) pair generated for this model and engine.
 
-        return cls
+        Any field typedefs still waiting to be bound are bound first, so
+        that their functions can be inlined into the generated code.  The
+        code is regenerated each time the model is bound to an engine.
+
+        Pass ``model_cache=<directory>`` in the bind config to keep the
+        compiled code on disk, so later processes that bind the same model
+        (same fields, engine namespace and config) skip compiling it.
+        Entries are checked against the generated source and rewritten
+        when stale, and the directory can be shared by several processes.
+
+        ``load`` takes a wire dict and returns an instance of the model,
+        ``dump`` takes an instance and returns a wire dict.  Both pass any
+        context on to the field typedefs.
+
+        Example
+        -------
+
+        .. code-block:: python
+
+            class Person(metaclass=ModelMetaclass):
+                name = Field(typedef=String)
+                age = Field(typedef=Integer)
+
+            engine = TypeEngine("people")
+            engine.register(Person)
+            engine.bind()
+            person = engine.load(Person, {"name": "Jill", "age": "30"})
+
+        """
+        type(cls).finalize(cls)
+        for field in cls.Meta.fields:
+            if field.typedef is not None:
+                # Binds pending typedefs and rejects coroutine functions,
+                # which the synchronous generated code can't await
+                _child_functions(engine, field.typedef, config)
+        return _compile_model(cls, engine, config)
+
+    def from_rows(cls, rows, engine, **kwargs):
+        """
+        Lazily load instances from positional rows.
+
+        Each row is a sequence with one value per field, in ``Meta.fields``
+        order, such as a database cursor row or a CSV record.  Values are
+        loaded with the field typedefs' bound functions and set on a new
+        instance without calling ``__init__`` or building a wire dict.
+        ``None`` leaves a field unset, except for fields whose typedef is
+        :class:`~Optional`, which are set to the loaded ``None``.
+
+        The row conversion code is generated the first time this engine
+        is used, and again after the engine binds another typedef.
+
+        Parameters
+        ----------
+        rows : iterable
+            Rows to load; consumed one at a time
+        engine : :class:`~TypeEngine`
+            Engine the model is bound to
+        **kwargs : kwargs
+            Context for the values being loaded
+
+        Returns
+        -------
+        objs : generator
+            Loaded instances, in the same order as the rows
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the model is not bound to the engine
+
+        Example
+        -------
+
+        .. code-block:: python
+
+            cursor.execute("SELECT name, age FROM people")
+            for person in Person.from_rows(cursor, engine=engine):
+                ...
+
+        """
+        return cls._row_functions(engine)[0](rows, **kwargs)
+
+    def to_rows(cls, objs, engine, **kwargs):
+        """
+        Lazily dump instances to positional rows.
+
+        The counterpart of :meth:`~ModelMetaclass.from_rows`: yields a
+        tuple of dumped values for each instance, in ``Meta.fields`` order,
+        with ``None`` for fields that aren't set.  An unset
+        :class:`~Optional` field is loaded back as ``None``.
+        """
+        return cls._row_functions(engine)[1](objs, **kwargs)
+
+    def _row_functions(cls, engine):
+        if cls not in engine.bound_types:
+            raise DeclareException(
+                "Can't convert rows of unknown type {}".format(cls))
+        type(cls).finalize(cls)
+        compiled = cls.Meta.__dict__.get("_row_functions")
+        if compiled is None:
+            # Weak, so engines aren't kept alive by the models they bind
+            compiled = cls.Meta._row_functions = weakref.WeakKeyDictionary()
+        generation, functions = compiled.get(engine, (None, None))
+        if generation != engine.generation:
+            functions = _compile_rows(cls, engine)
+            compiled[engine] = engine.generation, functions
+        return functions
+
+    def record_struct(cls):
+        """
+        Return the :class:`struct.Struct` used to pack this model's records.
+
+        Each field's dumped value is packed with its typedef's
+        :attr:`~TypeDefinition.struct_format`, in ``Meta.fields`` order,
+        little-endian and without padding.  The struct is built once and
+        kept on ``Meta``.
+
+        Raises
+        ------
+        exc : :class:`~DeclareException`
+            If the model has no fields, or a field has no typedef or a
+            backing type without a fixed-width format
+        """
+        record = cls.Meta.__dict__.get("_record_struct")
+        if record is None:
+            type(cls).finalize(cls)
+            if not cls.Meta.fields:
+                raise DeclareException(
+                    "Can't pack {} without fields".format(cls.__name__))
+            formats = []
+            for field in cls.Meta.fields:
+                typedef = field.typedef
+                fmt = getattr(typedef, "struct_format", None)
+                if fmt is None and typedef is not None:
+                    fmt = _struct_formats.get(typedef.backing_type)
+                if fmt is None:
+                    raise DeclareException(
+                        "Can't pack field {} of {} with typedef {}".format(
+                            field.model_name, cls.__name__, typedef))
+                formats.append(fmt)
+            record = struct.Struct("<" + "".join(formats))
+            cls.Meta._record_struct = record
+        return record
+
+
+def _numpy():
+    """Import NumPy on first use, so that importing declare doesn't"""
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover
+        raise ImportError("ColumnBatch requires numpy")
+    return numpy
+
+
+def _column_dtype(typedef):
+    """NumPy dtype for a column of loaded values, ``object`` if not numeric"""
+    numpy = _numpy()
+    python_type = getattr(typedef, "python_type", None)
+    if python_type in (bool, int, float, complex):
+        return numpy.dtype(python_type)
+    if subclassof(python_type, (numpy.number, numpy.bool_)):
+        return numpy.dtype(python_type)
+    return numpy.dtype(object)
+
+
+class _ColumnRow:
+    """Mapping of one row in a :class:`~ColumnBatch`, used as a view's
+    ``__dict__`` so that :class:`~Field` storage reads the columns"""
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def __getitem__(self, name):
+        if not self.batch.present[name][self.index]:
+            raise KeyError(name)
+        return self.batch.columns[name][self.index]
+
+    def __setitem__(self, name, value):
+        self.batch.columns[name][self.index] = value
+        self.batch.present[name][self.index] = True
+
+    def __delitem__(self, name):
+        if not self.batch.present[name][self.index]:
+            raise KeyError(name)
+        self.batch.present[name][self.index] = False
+
+    def __contains__(self, name):
+        present = self.batch.present.get(name)
+        return present is not None and bool(present[self.index])
+
+
+def _row_property(name):
+    """Property that redirects a Meta.slots field's slot to a _ColumnRow"""
+    def fget(self):
+        try:
+            return self._row[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def fset(self, value):
+        self._row[name] = value
+
+    def fdel(self):
+        try:
+            del self._row[name]
+        except KeyError:
+            raise AttributeError(name)
+    return property(fget, fset, fdel)
+
+
+def _view_class(model):
+    """Subclass of ``model`` whose instances store fields in a _ColumnRow"""
+    view = model.Meta.__dict__.get("_column_view")
+    if view is None:
+        attrs = {
+            "__slots__": ("_row",),
+            "__dict__": property(lambda self: self._row),
+            "__module__": model.__module__,
+            "__qualname__": model.__qualname__ + "View",
+            "Meta": model.Meta}
+        for field in model.Meta.fields:
+            if field._slot is not None:
+                attrs[field._slot] = _row_property(field.model_name)
+        # Skip ModelMetaclass.__new__ so the view shares the model's Meta
+        view = type.__new__(type(model), model.__name__ + "View",
+                            (model,), attrs)
+        model.Meta._column_view = view
+    return view
+
+
+class ColumnBatch:
+    """
+    Columnar storage for many instances of one model.
+
+    Each field in ``model.Meta.fields`` is stored as a single NumPy array.
+    Fields whose typedef has a numeric ``python_type`` (``bool``, ``int``,
+    ``float``, ``complex`` or a NumPy scalar type) use a matching dtype;
+    everything else is stored in an ``object`` array.  A boolean array per
+    field tracks which rows have a value.
+
+    Indexing or iterating a batch returns lightweight views, which are
+    instances of a subclass of the model.  Their fields are read and written
+    through the model's :class:`~Field` descriptors, backed by the columns
+    instead of a per-instance ``__dict__``.  Values from numeric columns are
+    NumPy scalars.
+
+    Requires NumPy.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        batch = ColumnBatch.load(Point, wires, engine)
+        xs = batch.columns["x"]
+        print(xs.mean(), batch[0].x)
+        wires = batch.dump(engine)
+
+    """
+    def __init__(self, model, size):
+        numpy = _numpy()
+        type(model).finalize(model)
+        self.model = model
+        self.size = size
+        self.columns = {}
+        self.present = {}
+        for field in model.Meta.fields:
+            name = field.model_name
+            dtype = _column_dtype(field.typedef)
+            self.columns[name] = numpy.empty(size, dtype)
+            self.present[name] = numpy.zeros(size, dtype=bool)
+
+    @classmethod
+    def load(cls, model, wires, engine, *, errors="raise", failures=None,
+             **kwargs):
+        """
+        Load a sequence of wire dicts into a new batch.
+
+        Each field's values are converted with a single call to
+        :meth:`TypeEngine.load_many`, so typedefs with batch hooks can
+        convert a whole column at once.  Fields without a typedef are stored
+        unchanged.  Keys missing from a wire dict leave that row unset.
+
+        With ``errors`` set to ``"drop"`` or ``"collect"``, a value that
+        fails to load leaves its row unset for that field, and the rest of
+        the batch is kept.  When collecting, each :class:`~LoadFailure`
+        has the row's index and the field's ``model_name``, and failures
+        are grouped by field.
+        """
+        if errors == "collect" and failures is None:
+            raise ValueError("errors='collect' requires a failures list")
+        wires = list(wires)
+        batch = cls(model, len(wires))
+        for field in model.Meta.fields:
+            name = field.model_name
+            rows, values = [], []
+            for i, wire in enumerate(wires):
+                value = wire.get(name, missing)
+                if value is not missing:
+                    rows.append(i)
+                    values.append(value)
+            if field.typedef is not None and errors == "raise":
+                values = engine.load_many(field.typedef, values, **kwargs)
+            elif field.typedef is not None:
+                column_failures = []
+                values = engine.load_many(
+                    field.typedef, values, errors="collect",
+                    failures=column_failures, **kwargs)
+                failed = {failure.index for failure in column_failures}
+                if errors == "collect":
+                    failures.extend(
+                        failure._replace(index=rows[failure.index],
+                                         field=name)
+                        for failure in column_failures)
+                rows = [row for i, row in enumerate(rows) if i not in failed]
+            batch._fill(name, rows, values)
+        return batch
+
+    @classmethod
+    def from_objects(cls, model, objs):
+        """Copy the field values of model instances into a new batch"""
+        objs = list(objs)
+        batch = cls(model, len(objs))
+        for field in model.Meta.fields:
+            rows, values = [], []
+            for i, obj in enumerate(objs):
+                try:
+                    values.append(field.__get__(obj, model))
+                except AttributeError:
+                    continue
+                rows.append(i)
+            batch._fill(field.model_name, rows, values)
+        return batch
+
+    def _fill(self, name, rows, values):
+        column = self.columns[name]
+        if column.dtype == object:
+            # Assign one at a time so NumPy doesn't unpack nested sequences
+            for row, value in zip(rows, values):
+                column[row] = value
+        else:
+            column[rows] = values
+        self.present[name][rows] = True
+
+    def dump(self, engine, **kwargs):
+        """
+        Dump every row into a list of wire dicts.
+
+        Each field's values are converted with a single call to
+        :meth:`TypeEngine.dump_many`.  Numeric columns are passed as NumPy
+        arrays, and ``object`` columns as lists.  Unset values are skipped.
+        """
+        numpy = _numpy()
+        wires = [{} for _ in range(self.size)]
+        for field in self.model.Meta.fields:
+            name = field.model_name
+            rows = numpy.flatnonzero(self.present[name])
+            values = self.columns[name][rows]
+            if values.dtype == object:
+                values = values.tolist()
+            if field.typedef is not None:
+                values = engine.dump_many(field.typedef, values, **kwargs)
+            for row, value in zip(rows.tolist(), values):
+                wires[row][name] = value
+        return wires
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("ColumnBatch index out of range")
+        view_class = _view_class(self.model)
+        view = view_class.__new__(view_class)
+        view._row = _ColumnRow(self, index)
+        return view
+
+    def __iter__(self):
+        view_class = _view_class(self.model)
+        for index in range(self.size):
+            view = view_class.__new__(view_class)
+            view._row = _ColumnRow(self, index)
+            yield view
+
+
+# Each record in a record file is a length followed by the encoded wire dict
+_record_header = struct.Struct("<I")
+
+
+def _index_path(path):
+    """Path of the offset index kept next to a record file"""
+    return path + ".idx"
+
+
+def _record_offsets(buffer, index_path):
+    """
+    Return (offsets, end) for the complete records in ``buffer``.
+
+    Offsets are read from the index file, dropping any past the last
+    record that is complete in ``buffer``, and records appended after the
+    index was written are found by scanning from there.  ``end`` is the
+    end of the last complete record, so a record cut off by a crash is
+    ignored.
+    """
+    offsets = array.array("Q")
+    try:
+        with open(index_path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = b""
+    offsets.frombytes(data[:len(data) - len(data) % offsets.itemsize])
+    if sys.byteorder == "big":  # pragma: no cover
+        offsets.byteswap()
+
+    def record_end(offset):
+        start = offset + _record_header.size
+        if start > len(buffer):
+            return None
+        end = start + _record_header.unpack_from(buffer, offset)[0]
+        return end if end <= len(buffer) else None
+
+    end = 0
+    while offsets:
+        last = record_end(offsets[-1])
+        if last is not None:
+            end = last
+            break
+        offsets.pop()
+    while True:
+        last = record_end(end)
+        if last is None:
+            return offsets, end
+        offsets.append(end)
+        end = last
+
+
+def _write_offsets(f, offsets):
+    if sys.byteorder == "big":  # pragma: no cover
+        offsets = array.array("Q", offsets)
+        offsets.byteswap()
+    offsets.tofile(f)
+
+
+class RecordReader:
+    """
+    Random access and lazy iteration over a file of model records.
+
+    The file is memory-mapped, so opening it only reads the offset index
+    kept next to it (``<path>.idx``), not the records.  A missing or
+    outdated index is completed by scanning the records it doesn't cover.
+    Each record is decoded and loaded through the engine's bound model
+    load only when it is accessed.
+
+    The reader sees the records that were complete when it was opened.
+    Files are written by :class:`~RecordWriter`.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Record file to read
+    model : :class:`~ModelMetaclass`
+        Model of the records, bound to ``engine``
+    engine : :class:`~TypeEngine`
+        Engine whose bound load is used for each record
+    loads : callable
+        Decodes a record's bytes into a wire dict.  Must match the writer's
+        ``dumps``.  Choose a codec that is safe for the file's source:
+        :func:`pickle.loads` runs arbitrary code from a tampered file.
+    **kwargs : kwargs
+        Context for the values being loaded
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        with RecordReader("users.rec", User, engine,
+                          loads=json.loads) as users:
+            print(len(users), users[-1])
+            for user in users:
+                ...
+
+    """
+    def __init__(self, path, model, engine, *, loads, **kwargs):
+        self.path = os.fspath(path)
+        self.model = model
+        self.engine = engine
+        self._loads = loads
+        self._context = kwargs
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                # Empty files can't be mapped
+                self._map = b""
+        self._offsets, _ = _record_offsets(
+            self._map, _index_path(self.path))
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        offset = self._offsets[index]
+        length, = _record_header.unpack_from(self._map, offset)
+        start = offset + _record_header.size
+        wire = self._loads(self._map[start:start + length])
+        return self.engine.load(self.model, wire, **self._context)
+
+    def __iter__(self):
+        for index in range(len(self._offsets)):
+            yield self[index]
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordWriter:
+    """
+    Append model records to a file read by :class:`~RecordReader`.
+
+    Each instance is dumped with the engine's bound model dump, encoded,
+    and appended with its length.  Its offset is appended to the index file
+    (``<path>.idx``) at the same time.  Opening an existing file continues
+    after its last complete record: a record cut off by a crash is
+    truncated, and an outdated index is rewritten.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Record file to append to; created if it doesn't exist
+    model : :class:`~ModelMetaclass`
+        Model of the records, bound to ``engine``
+    engine : :class:`~TypeEngine`
+        Engine whose bound dump is used for each record
+    dumps : callable
+        Encodes a wire dict as bytes, for the reader's ``loads``
+    **kwargs : kwargs
+        Context for the values being dumped
+
+    """
+    def __init__(self, path, model, engine, *, dumps, **kwargs):
+        self.path = os.fspath(path)
+        self.model = model
+        self.engine = engine
+        self._dumps = dumps
+        self._context = kwargs
+        index_path = _index_path(self.path)
+        self._data = open(self.path, "a+b")
+        try:
+            size = os.fstat(self._data.fileno()).st_size
+            if size:
+                with mmap.mmap(self._data.fileno(), 0,
+                               access=mmap.ACCESS_READ) as buffer:
+                    offsets, self._end = _record_offsets(buffer, index_path)
+            else:
+                offsets, self._end = array.array("Q"), 0
+            if self._end != size:
+                self._data.truncate(self._end)
+            self._count = len(offsets)
+            try:
+                indexed = os.path.getsize(index_path)
+            except FileNotFoundError:
+                indexed = None
+            if indexed == len(offsets) * offsets.itemsize:
+                self._index = open(index_path, "ab")
+            else:
+                self._index = open(index_path, "wb")
+                _write_offsets(self._index, offsets)
+        except BaseException:
+            self._data.close()
+            raise
+
+    def __len__(self):
+        return self._count
+
+    def append(self, obj):
+        """Dump and append one instance"""
+        wire = self.engine.dump(self.model, obj, **self._context)
+        record = self._dumps(wire)
+        self._data.write(_record_header.pack(len(record)))
+        self._data.write(record)
+        _write_offsets(self._index, array.array("Q", [self._end]))
+        self._end += _record_header.size + len(record)
+        self._count += 1
+
+    def extend(self, objs):
+        """Dump and append each instance"""
+        for obj in objs:
+            self.append(obj)
+
+    def flush(self):
+        # Records first, so the index never points past the data
+        self._data.flush()
+        self._index.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -19,6 +19,11 @@ TEST_REQUIREMENTS = [
     'pytest',
 ]
 
+# ColumnBatch needs numpy, which is only imported when it's used
+EXTRAS = {
+    'numpy': ['numpy'],
+}
+
 if __name__ == "__main__":
     setup(
         name='declare',
@@ -32,9 +37,7 @@ if __name__ == "__main__":
             'Operating System :: OS Independent',
             'Programming Language :: Python',
             'Programming Language :: Python :: 3',
-            'Programming Language :: Python :: 3.2',
-            'Programming Language :: Python :: 3.3',
-            'Programming Language :: Python :: 3.4',
+            'Programming Language :: Python :: 3.6',
             'Topic :: Software Development :: Libraries',
             'Topic :: Software Development :: Libraries :: Python Modules'
         ],
@@ -43,10 +46,12 @@ if __name__ == "__main__":
         url='https://github.com/numberoverzero/declare',
         license='MIT',
         keywords='meta metaclass declarative',
+        python_requires='>=3.6',
         platforms='any',
         include_package_data=True,
         py_modules=['declare'],
         packages=find_packages(exclude=('tests',)),
         install_requires=REQUIREMENTS,
-        tests_require=REQUIREMENTS + TEST_REQUIREMENTS,
+        extras_require=EXTRAS,
+        tests_require=REQUIREMENTS + TEST_REQUIREMENTS + EXTRAS['numpy'],
     )
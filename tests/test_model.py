@@ -1,5 +1,18 @@
+import concurrent.futures
+import copy
+import json
+import marshal
+import os
+import struct
+import subprocess
+import sys
+import threading
 import pytest
-from declare import Field, TypeDefinition, ModelMetaclass
+import declare
+from declare import (Field, TypeDefinition, TypeEngine, TypeEngineMeta,
+                     DeclareException, ModelMetaclass, ColumnBatch, changes,
+                     clear_changes, RecordReader, RecordWriter, List, Map,
+                     Optional)
 
 
 def test_default_metadata():
@@ -84,3 +97,1121 @@ def test_model_metaclass_is_typedef():
     class Model(metaclass=ModelMetaclass):
         f = Field()
     assert isinstance(Model, TypeDefinition)
+
+
+class Upper(TypeDefinition):
+    def _load(self, value, **kwargs):
+        return value.upper()
+
+    def _dump(self, value, **kwargs):
+        return value.lower()
+
+
+def bound_engine(*typedefs):
+    engine = TypeEngine.unique()
+    for typedef in typedefs:
+        engine.register(typedef)
+    engine.bind()
+    return engine
+
+
+def test_register_model_registers_fields():
+
+    ''' registering a model registers each field's typedef '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+        g = Field()
+
+    engine = bound_engine(Model)
+    assert Model in engine
+    assert Model.f.typedef in engine
+
+
+def test_compiled_load_dump():
+
+    ''' bound models load from and dump to wire dicts '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+        g = Field()
+
+        def __init__(self):
+            raise RuntimeError("load doesn't call __init__")
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "abc", "g": 1, "other": 2})
+    assert isinstance(obj, Model)
+    assert obj.__dict__ == {"f": "ABC", "g": 1}
+    assert engine.dump(Model, obj) == {"f": "abc", "g": 1}
+
+
+def test_compiled_missing_values():
+
+    ''' missing values are skipped in both directions '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+        g = Field(typedef=Upper)
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "abc"})
+    assert not hasattr(obj, "g")
+    del obj.f
+    assert engine.dump(Model, obj) == {}
+
+
+def test_compiled_uses_field_overrides():
+
+    ''' fields that override set/get are used by the generated code '''
+    class Counting(Field):
+        calls = 0
+
+        def set(self, obj, value):
+            Counting.calls += 1
+            super().set(obj, value)
+
+        def get(self, obj):
+            Counting.calls += 1
+            return super().get(obj)
+
+    class Model(metaclass=ModelMetaclass):
+        f = Counting(typedef=Upper)
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "abc"})
+    assert engine.dump(Model, obj) == {"f": "abc"}
+    assert Counting.calls == 2
+
+
+def test_compiled_nested_models():
+
+    ''' models can be field types of other models, including themselves '''
+    class Inner(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+
+    class Outer(metaclass=ModelMetaclass):
+        inner = Field(typedef=Inner)
+        g = Field(typedef=Upper)
+    Outer.child = Field(typedef=Outer)
+    Outer.child.model_name = "child"
+    Outer.Meta.fields.append(Outer.child)
+
+    engine = bound_engine(Outer)
+    wire = {"inner": {"f": "abc"}, "child": {"g": "def"}}
+    obj = engine.load(Outer, wire)
+    assert obj.inner.f == "ABC"
+    assert obj.child.g == "DEF"
+    assert engine.dump(Outer, obj) == wire
+
+
+def test_bind_per_engine():
+
+    ''' each engine gets code generated from its own bound functions '''
+    class Namespaced(TypeDefinition):
+        def bind(self, engine, **config):
+            def load(value, **kwargs):
+                return engine.namespace + value
+            return load, self._dump
+
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Namespaced)
+
+    first = bound_engine(Model)
+    second = bound_engine(Model)
+    assert first.load(Model, {"f": "!"}).f == first.namespace + "!"
+    assert second.load(Model, {"f": "!"}).f == second.namespace + "!"
+
+
+class Integer(TypeDefinition):
+    python_type = int
+
+    def _load(self, value, **kwargs):
+        return int(value)
+
+    def _dump(self, value, **kwargs):
+        return str(value)
+
+
+def test_numpy_imported_on_first_use():
+
+    ''' importing declare doesn't import numpy (or asyncio) until needed '''
+    code = ("import sys, declare; "
+            "print('numpy' in sys.modules or 'asyncio' in sys.modules)")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(declare.__file__))
+    output = subprocess.check_output([sys.executable, "-c", code], env=env)
+    assert output.strip() == b"False"
+
+
+def test_column_batch_load_dump():
+
+    ''' columns use numeric dtypes when the python_type is numeric '''
+    numpy = pytest.importorskip("numpy")
+
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Integer)
+        name = Field(typedef=Upper)
+        raw = Field()
+
+    engine = bound_engine(Model)
+    wires = [{"x": "1", "name": "a", "raw": [1, 2]},
+             {"x": "2", "name": "b"}]
+    batch = ColumnBatch.load(Model, wires, engine)
+
+    assert len(batch) == 2
+    assert batch.columns["x"].dtype == numpy.int64
+    assert batch.columns["x"].sum() == 3
+    assert batch.columns["name"].dtype == object
+    assert batch.columns["raw"][0] == [1, 2]
+    assert batch.dump(engine) == wires
+
+
+def test_column_batch_optional():
+
+    ''' nullable fields are stored in object columns '''
+    pytest.importorskip("numpy")
+
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Optional(Integer))
+
+    engine = bound_engine(Model)
+    wires = [{"x": "1"}, {"x": None}]
+    batch = ColumnBatch.load(Model, wires, engine)
+    assert batch.columns["x"].dtype == object
+    assert batch[0].x == 1 and batch[1].x is None
+    assert batch.dump(engine) == wires
+
+
+def test_column_batch_views():
+
+    ''' views are model instances backed by the batch columns '''
+    pytest.importorskip("numpy")
+
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Integer)
+        name = Field(typedef=Upper)
+
+    engine = bound_engine(Model)
+    batch = ColumnBatch.load(Model, [{"x": "1"}, {"x": "2"}], engine)
+
+    first, second = batch
+    assert isinstance(first, Model)
+    assert first.x == 1 and Model.x.__get__(second, Model) == 2
+    with pytest.raises(AttributeError):
+        first.name
+
+    second.x = 5
+    first.name = "A"
+    del second.x
+    assert batch[0].name == "A"
+    assert batch[-1].__dict__ is not None
+    with pytest.raises(AttributeError):
+        batch[1].x
+    with pytest.raises(IndexError):
+        batch[2]
+    # Generated dump reads views through the same storage
+    assert engine.dump(Model, first) == {"x": "1", "name": "a"}
+
+
+def test_column_batch_from_objects():
+
+    ''' instances are copied into columns, skipping unset fields '''
+    pytest.importorskip("numpy")
+
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Integer)
+        y = Field()
+
+    engine = bound_engine(Model)
+    objs = [engine.load(Model, {"x": "1", "y": "a"}),
+            engine.load(Model, {"y": "b"})]
+    batch = ColumnBatch.from_objects(Model, objs)
+    assert batch.dump(engine) == [{"x": "1", "y": "a"}, {"y": "b"}]
+
+
+def test_slots_model():
+
+    ''' Meta.slots stores field values in generated slots '''
+    class Model(metaclass=ModelMetaclass):
+        __slots__ = "other"
+        f = Field()
+        g = Field()
+
+        class Meta:
+            slots = True
+
+    obj = Model()
+    assert not hasattr(obj, "__dict__")
+    assert Model.__slots__ == ("other", "_declare_f", "_declare_g")
+
+    with pytest.raises(AttributeError):
+        obj.f
+    with pytest.raises(AttributeError):
+        del obj.f
+    obj.f = "value"
+    assert obj.f == "value"
+    del obj.f
+    assert not hasattr(obj, "f")
+    with pytest.raises(AttributeError):
+        obj.unknown = "value"
+
+
+def test_slots_model_overrides():
+
+    ''' set/get/delete overrides still wrap slot storage '''
+    class Doubling(Field):
+        def set(self, obj, value):
+            super().set(obj, value * 2)
+
+    class Model(metaclass=ModelMetaclass):
+        f = Doubling()
+
+        class Meta:
+            slots = True
+
+    obj = Model()
+    obj.f = 2
+    assert obj.f == 4
+
+
+def test_slots_compiled_load_dump():
+
+    ''' generated load/dump use slots for Meta.slots models '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+        g = Field()
+
+        class Meta:
+            slots = True
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "abc"})
+    assert obj.f == "ABC"
+    assert not hasattr(obj, "g")
+    assert engine.dump(Model, obj) == {"f": "abc"}
+
+
+def test_slots_column_batch_views():
+
+    ''' column views redirect slot storage to the batch '''
+    pytest.importorskip("numpy")
+
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Integer)
+        name = Field()
+
+        class Meta:
+            slots = True
+
+    engine = bound_engine(Model)
+    batch = ColumnBatch.load(Model, [{"x": "1"}], engine)
+    view = batch[0]
+    assert view.x == 1
+    with pytest.raises(AttributeError):
+        view.name
+    view.name = "a"
+    assert batch.columns["name"][0] == "a"
+    assert engine.dump(Model, view) == {"x": "1", "name": "a"}
+
+
+def test_bind_parallel_models():
+
+    ''' models are bound after their fields, with inlined functions '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+
+    engine = TypeEngine.unique()
+    engine.register(Model)
+    timings = engine.bind_parallel()
+    assert list(timings) == [Model, Model.f.typedef]
+    assert engine.load(Model, {"f": "a"}).f == "A"
+
+
+def test_model_python_type():
+
+    ''' models resolve as their own python_type, and dump to dicts '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+
+    class Other(metaclass=ModelMetaclass):
+        python_type = Field()
+
+    assert Model.python_type is Model
+    assert Model.backing_type is dict
+    assert isinstance(Other.python_type, Field)
+
+    engine = bound_engine(Model)
+    obj = engine.load_value({"f": "a"}, python_type=Model)
+    assert obj.f == "A"
+    assert engine.dump_value(obj) == {"f": "a"}
+
+
+class CountingUpper(Upper):
+    loads = 0
+
+    def _load(self, value, **kwargs):
+        CountingUpper.loads += 1
+        return super()._load(value, **kwargs)
+
+
+@pytest.mark.parametrize("slots", [False, True])
+def test_lazy_model_loads_on_first_get(slots):
+
+    ''' Meta.lazy fields are loaded on first access, then cached '''
+    Model = ModelMetaclass("Model", (), {
+        "Meta": type("Meta", (), {"lazy": True, "slots": slots}),
+        "f": Field(typedef=CountingUpper),
+        "g": Field(typedef=CountingUpper),
+        "h": Field()})
+    CountingUpper.loads = 0
+    engine = bound_engine(Model)
+    wire = {"f": "a", "g": "b", "h": [1]}
+    obj = engine.load(Model, wire)
+    assert CountingUpper.loads == 0
+
+    assert obj.f == "A"
+    assert obj.f == "A"
+    assert CountingUpper.loads == 1
+    assert obj.h == [1]
+    # The caller's wire dict isn't modified
+    assert wire == {"f": "a", "g": "b", "h": [1]}
+    with pytest.raises(AttributeError):
+        engine.load(Model, {}).f
+
+
+@pytest.mark.parametrize("slots", [False, True])
+def test_lazy_model_dump_passes_raw_values(slots):
+
+    ''' untouched values are dumped without a load/dump round trip '''
+    Model = ModelMetaclass("Model", (), {
+        "Meta": type("Meta", (), {"lazy": True, "slots": slots}),
+        "f": Field(typedef=CountingUpper),
+        "g": Field(typedef=CountingUpper),
+        "h": Field()})
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "RAW", "g": "b", "h": 1})
+
+    CountingUpper.loads = 0
+    obj.h = 2
+    assert engine.dump(Model, obj) == {"f": "RAW", "g": "b", "h": 2}
+    assert CountingUpper.loads == 0
+
+    obj.g
+    obj.f = "NEW"
+    assert engine.dump(Model, obj) == {"f": "new", "g": "b", "h": 2}
+
+
+@pytest.mark.parametrize("slots", [False, True])
+def test_lazy_model_delete(slots):
+
+    ''' deleting a field discards its raw value too '''
+    Model = ModelMetaclass("Model", (), {
+        "Meta": type("Meta", (), {"lazy": True, "slots": slots}),
+        "f": Field(typedef=CountingUpper),
+        "g": Field(typedef=CountingUpper),
+        "h": Field()})
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "a", "g": "b"})
+
+    del obj.f
+    obj.g = "c"
+    del obj.g
+    with pytest.raises(AttributeError):
+        obj.f
+    with pytest.raises(AttributeError):
+        obj.g
+    with pytest.raises(AttributeError):
+        del obj.h
+    assert engine.dump(Model, obj) == {}
+
+
+@pytest.mark.parametrize("slots", [False, True])
+def test_lazy_model_copies(slots):
+
+    ''' copies share raw values, but loading or deleting doesn't touch them '''
+    Model = ModelMetaclass("Model", (), {
+        "Meta": type("Meta", (), {"lazy": True, "slots": slots}),
+        "f": Field(typedef=Upper),
+        "g": Field(typedef=Upper)})
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "a", "g": "b"})
+    other = copy.copy(obj)
+
+    assert obj.f == "A"
+    del obj.g
+    assert (other.f, other.g) == ("A", "B")
+    assert engine.dump(Model, other) == {"f": "a", "g": "b"}
+    assert engine.dump(Model, obj) == {"f": "a"}
+
+
+@pytest.mark.parametrize("slots", [False, True])
+def test_track_changes(slots):
+
+    ''' set and delete record changed fields; loading doesn't '''
+    Model = ModelMetaclass("Model", (), {
+        "Meta": type("Meta", (), {"track_changes": True, "slots": slots}),
+        "f": Field(typedef=Upper),
+        "g": Field(typedef=Upper),
+        "h": Field()})
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "a", "g": "b"})
+    assert changes(obj) == set()
+
+    obj.f = "C"
+    del obj.g
+    obj.h = 1
+    assert changes(obj) == {"f", "g", "h"}
+    assert engine.dump_changes(obj) == {"f": "c", "h": 1}
+
+    clear_changes(obj)
+    assert changes(obj) == set()
+    assert engine.dump_changes(obj) == {}
+    with pytest.raises(AttributeError):
+        del obj.g
+    assert changes(obj) == set()
+
+
+def test_untracked_models_have_no_changes():
+
+    ''' models without Meta.track_changes never record changes '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field()
+
+    obj = Model()
+    obj.f = 1
+    assert changes(obj) == set()
+    assert "_declare_changes" not in obj.__dict__
+    clear_changes(obj)
+
+
+def test_track_changes_load_with_set_override():
+
+    ''' overridden set methods called while loading aren't changes '''
+    class Logged(Field):
+        def set(self, obj, value):
+            super().set(obj, value)
+
+    class Model(metaclass=ModelMetaclass):
+        f = Logged(typedef=Upper)
+
+        class Meta:
+            track_changes = True
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "a"})
+    assert changes(obj) == set()
+    obj.f = "B"
+    assert engine.dump_changes(obj) == {"f": "b"}
+
+
+@pytest.mark.parametrize("slots", [False, True])
+def test_deferred_model_finalized_on_first_use(slots):
+
+    ''' Meta.deferred models name their fields when an instance is used '''
+    f = Field()
+    Model = ModelMetaclass("Model", (), {
+        "Meta": type("Meta", (), {"deferred": True, "slots": slots}),
+        "field": f})
+
+    assert f.model_name is None
+    assert not hasattr(Model.Meta, "fields")
+
+    obj = Model()
+    obj.field = "value"
+    assert obj.field == "value"
+    assert f.model_name == "field"
+    assert Model.Meta.fields == [f]
+    assert Model.Meta.fields_by_model_name == {"field": f}
+    assert hasattr(obj, "__dict__") != slots
+
+
+def test_deferred_model_bind():
+
+    ''' registering a deferred model finalizes it before binding '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+
+        class Meta:
+            deferred = True
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"f": "a"})
+    assert obj.f == "A"
+    assert engine.dump(Model, obj) == {"f": "a"}
+
+
+def test_deferred_model_subclass():
+
+    ''' using a subclass finalizes deferred base models too '''
+    class Base(metaclass=ModelMetaclass):
+        f = Field()
+
+        class Meta:
+            deferred = True
+
+    class Derived(Base):
+        g = Field()
+
+    obj = Derived()
+    obj.f = 1
+    assert obj.f == 1
+    assert Base.Meta.fields == [Base.f]
+    assert Derived.Meta.fields == [Derived.g]
+
+
+@pytest.mark.parametrize("deferred", [False, True])
+def test_field_named_finalize(deferred):
+
+    ''' a field named finalize doesn't shadow ModelMetaclass.finalize '''
+    Model = ModelMetaclass("Model", (), {
+        "Meta": type("Meta", (), {"deferred": deferred}),
+        "finalize": Field(typedef=Upper)})
+
+    obj = Model()
+    obj.finalize = "a"
+    assert obj.finalize == "a"
+    engine = bound_engine(Model)
+    assert engine.dump(Model, engine.load(Model, {"finalize": "b"})) == {
+        "finalize": "b"}
+
+
+def test_deferred_model_shared_field():
+
+    ''' a field used by two models still raises, once finalized '''
+    f = Field()
+
+    class Model(metaclass=ModelMetaclass):
+        field = f
+
+    class Other(metaclass=ModelMetaclass):
+        field = f
+
+        class Meta:
+            deferred = True
+
+    with pytest.raises(AttributeError):
+        Other.finalize()
+
+
+def cached_bind(model, directory, namespace="model_cache", **config):
+    ''' bind model on a new engine, as a fresh process would '''
+    TypeEngineMeta.engines.pop(namespace, None)
+    engine = TypeEngine(namespace)
+    engine.register(model)
+    engine.bind(model_cache=str(directory), **config)
+    return engine
+
+
+def test_model_cache_reuses_compiled_code(tmp_path, monkeypatch):
+
+    ''' a second bind with the same schema loads code from the cache '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+        g = Field()
+
+    cached_bind(Model, tmp_path)
+    entries = list(tmp_path.iterdir())
+    assert len(entries) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("model code was compiled")
+    monkeypatch.setattr(declare, "compile", fail, raising=False)
+    engine = cached_bind(Model, tmp_path)
+    obj = engine.load(Model, {"f": "a", "g": 1})
+    assert (obj.f, obj.g) == ("A", 1)
+    assert engine.dump(Model, obj) == {"f": "a", "g": 1}
+    assert list(tmp_path.iterdir()) == entries
+
+
+def test_model_cache_key():
+
+    ''' namespace, config and fields each change the cache key '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+        g = Field()
+
+    engine = TypeEngine.unique()
+    key = declare._model_cache_key(Model, engine, {"model_cache": "a"})
+    assert key == declare._model_cache_key(Model, engine, {})
+    assert key != declare._model_cache_key(Model, engine, {"precision": 2})
+    assert key != declare._model_cache_key(
+        Model, TypeEngine.unique(), {})
+
+    class Other(metaclass=ModelMetaclass):
+        f = Field()
+        g = Field(typedef=Upper)
+    assert (declare._model_cache_key(Other, engine, {}) !=
+            declare._model_cache_key(Model, engine, {}))
+
+
+@pytest.mark.parametrize("contents", [b"", b"not marshal data", None])
+def test_model_cache_stale_entries(tmp_path, contents):
+
+    ''' unreadable or outdated entries are recompiled and replaced '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+        g = Field()
+
+    cached_bind(Model, tmp_path)
+    entry, = tmp_path.iterdir()
+    if contents is None:
+        # An entry written for different source
+        header = marshal.loads(entry.read_bytes())
+        code = compile("def load_model(wire, **kwargs): pass\n"
+                       "def dump_model(obj, **kwargs): pass\n",
+                       "<stale>", "exec")
+        contents = marshal.dumps(header[:2] + ("outdated",) + (code,))
+    entry.write_bytes(contents)
+
+    engine = cached_bind(Model, tmp_path)
+    assert engine.load(Model, {"f": "a"}).f == "A"
+    assert marshal.loads(entry.read_bytes())[2] != "outdated"
+    assert list(tmp_path.iterdir()) == [entry]
+
+
+def test_model_cache_concurrent_writers(tmp_path):
+
+    ''' writers racing on one entry leave a single, complete file '''
+    source = "def load_model(wire, **kwargs):\n    return wire\n"
+    barrier = threading.Barrier(8)
+
+    def write(_):
+        barrier.wait()
+        return declare._cached_code(tmp_path, "key", source, "<race>")
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        codes = list(executor.map(write, range(8)))
+    assert [path.name for path in tmp_path.iterdir()] == ["key.declare"]
+    assert marshal.loads((tmp_path / "key.declare").read_bytes())[-1] in codes
+
+
+class Cents(TypeDefinition):
+    ''' dollars in python, whole cents on the wire '''
+    python_type = float
+    backing_type = int
+
+    def _load(self, value, **kwargs):
+        return value / 100
+
+    def _dump(self, value, **kwargs):
+        return round(value * 100)
+
+
+class Port(TypeDefinition):
+    backing_type = int
+    struct_format = "H"
+
+
+class Ratio(TypeDefinition):
+    backing_type = float
+
+
+class Flag(TypeDefinition):
+    backing_type = bool
+
+
+def test_record_struct_layout():
+
+    ''' fields are packed in order, with overrides for struct_format '''
+    class Model(metaclass=ModelMetaclass):
+        price = Field(typedef=Cents)
+        port = Field(typedef=Port)
+        ratio = Field(typedef=Ratio)
+        active = Field(typedef=Flag)
+
+    record = Model.record_struct()
+    assert record.format == struct.Struct("<qHd?").format
+    assert record.size == 8 + 2 + 8 + 1
+    assert Model.record_struct() is record
+
+
+def test_pack_unpack_many():
+
+    ''' typedefs convert values on both sides of the packed records '''
+    class Model(metaclass=ModelMetaclass):
+        price = Field(typedef=Cents)
+        port = Field(typedef=Port)
+        ratio = Field(typedef=Ratio)
+        active = Field(typedef=Flag)
+
+    engine = bound_engine(Model)
+    objs = [engine.load(Model, {"price": i * 150, "port": 8000 + i,
+                                "ratio": i / 4, "active": i % 2 == 0})
+            for i in range(3)]
+
+    buffer = engine.pack_many(Model, objs)
+    assert isinstance(buffer, bytearray)
+    assert len(buffer) == 3 * Model.record_struct().size
+
+    loaded = engine.unpack_many(Model, buffer)
+    assert [engine.dump(Model, obj) for obj in loaded] == [
+        engine.dump(Model, obj) for obj in objs]
+    assert loaded[1].price == 1.5
+
+    # Any slice of whole records can be unpacked without copying
+    size = Model.record_struct().size
+    tail = engine.unpack_many(Model, memoryview(buffer)[size:])
+    assert [obj.port for obj in tail] == [8001, 8002]
+
+
+def test_pack_field_named_record_struct():
+
+    ''' a field named record_struct doesn't break pack_many '''
+    class Model(metaclass=ModelMetaclass):
+        record_struct = Field(typedef=Port)
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"record_struct": 7})
+    buffer = engine.pack_many(Model, [obj])
+    assert len(buffer) == 2
+    assert engine.unpack_many(Model, buffer)[0].record_struct == 7
+
+
+def test_pack_errors():
+
+    ''' models that can't be packed raise DeclareException '''
+    class Untyped(metaclass=ModelMetaclass):
+        f = Field()
+
+    class Text(metaclass=ModelMetaclass):
+        f = Field(typedef=Upper)
+
+    for model in (Untyped, Text):
+        with pytest.raises(DeclareException):
+            model.record_struct()
+
+    class Model(metaclass=ModelMetaclass):
+        price = Field(typedef=Cents)
+        port = Field(typedef=Port)
+        ratio = Field(typedef=Ratio)
+        active = Field(typedef=Flag)
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"price": 1, "port": 2, "ratio": 0.5})
+    with pytest.raises(DeclareException):
+        engine.pack_many(Model, [obj])
+    with pytest.raises(DeclareException):
+        engine.unpack_many(Model, b"\x00" * 5)
+
+
+def dumps(wire):
+    return json.dumps(wire).encode()
+
+
+def write_records(path, model, engine, values):
+    with RecordWriter(path, model, engine, dumps=dumps) as writer:
+        writer.extend(engine.load(model, {"f": value, "g": i})
+                      for i, value in enumerate(values))
+        return len(writer)
+
+
+def test_record_file_round_trip(tmp_path):
+
+    ''' records are loaded lazily, by index or in order '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=CountingUpper)
+        g = Field()
+
+    engine = bound_engine(Model)
+    path = tmp_path / "records"
+    assert write_records(path, Model, engine, ["a", "b", "c"]) == 3
+
+    CountingUpper.loads = 0
+    with RecordReader(path, Model, engine, loads=json.loads) as reader:
+        assert len(reader) == 3
+        assert CountingUpper.loads == 0
+        assert (reader[1].f, reader[1].g) == ("B", 1)
+        assert reader[-1].f == "C"
+        assert CountingUpper.loads == 3
+        records = iter(reader)
+        assert next(records).f == "A"
+        assert CountingUpper.loads == 4
+        assert [obj.g for obj in reader] == [0, 1, 2]
+        with pytest.raises(IndexError):
+            reader[3]
+    # No default codec: pickle would run code from a tampered file
+    with pytest.raises(TypeError):
+        RecordReader(path, Model, engine)
+
+
+def test_record_file_append_and_reindex(tmp_path):
+
+    ''' writers append to existing files; readers rebuild a lost index '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=CountingUpper)
+        g = Field()
+
+    engine = bound_engine(Model)
+    path = tmp_path / "records"
+    (tmp_path / "empty").touch()
+    with RecordReader(tmp_path / "empty", Model, engine,
+                      loads=json.loads) as reader:
+        assert list(reader) == []
+
+    write_records(path, Model, engine, ["a", "b"])
+    assert write_records(path, Model, engine, ["c"]) == 3
+    index = tmp_path / "records.idx"
+    assert index.stat().st_size == 3 * 8
+
+    index.unlink()
+    with RecordReader(path, Model, engine, loads=json.loads) as reader:
+        assert [obj.f for obj in reader] == ["A", "B", "C"]
+
+
+def test_record_file_partial_record(tmp_path):
+
+    ''' a record cut off mid-write is skipped, then overwritten '''
+    class Model(metaclass=ModelMetaclass):
+        f = Field(typedef=CountingUpper)
+        g = Field()
+
+    engine = bound_engine(Model)
+    path = tmp_path / "records"
+    write_records(path, Model, engine, ["a", "b"])
+    size = path.stat().st_size
+    with open(path, "ab") as f:
+        f.write(b"\xff\x00\x00\x00partial")
+
+    with RecordReader(path, Model, engine, loads=json.loads) as reader:
+        assert len(reader) == 2
+    assert write_records(path, Model, engine, ["c"]) == 3
+    assert path.stat().st_size > size
+    with RecordReader(path, Model, engine, loads=json.loads) as reader:
+        assert [obj.f for obj in reader] == ["A", "B", "C"]
+
+
+def test_nested_composite_models():
+
+    ''' models nest inside composites, including models that refer to
+    themselves '''
+    class Node(metaclass=ModelMetaclass):
+        name = Field(typedef=Upper)
+        parent = Field(typedef=Optional(lambda: Node))
+        children = Field(typedef=List(lambda: Node))
+
+    class Tree(metaclass=ModelMetaclass):
+        roots = Field(typedef=Map(Node))
+
+    wire = {"roots": {"r": {"name": "root", "parent": None, "children": [
+        {"name": "leaf", "parent": None, "children": []}]}}}
+    for bind in ("bind", "bind_parallel"):
+        engine = TypeEngine.unique()
+        engine.register(Tree)
+        getattr(engine, bind)()
+        tree = engine.load(Tree, wire)
+        root = tree.roots["r"]
+        assert isinstance(root, Node)
+        assert root.children[0].name == "LEAF"
+        assert engine.dump(Tree, tree) == wire
+
+
+def test_load_many_collect_model_fields():
+
+    ''' failed records report every failed field, with the record index '''
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Integer)
+        y = Field(typedef=Integer)
+        name = Field(typedef=Upper)
+
+    engine = bound_engine(Model)
+    wires = [{"x": "1", "y": "2", "name": "a"},
+             {"x": "bad", "y": "worse", "name": "b"},
+             {"x": "3", "y": "4"},
+             {"x": "5", "y": "nope", "name": "c"}]
+    failures = []
+    loaded = engine.load_many(Model, wires, errors="collect",
+                              failures=failures)
+    assert [(obj.x, obj.y) for obj in loaded] == [(1, 2), (3, 4)]
+    assert [(f.index, f.field, f.value) for f in failures] == [
+        (1, "x", "bad"), (1, "y", "worse"), (3, "y", "nope")]
+    assert all(isinstance(f.exception, ValueError) for f in failures)
+
+    failures = []
+    chunks = list(engine.iter_load(Model, wires, chunk_size=2,
+                                   errors="collect", failures=failures))
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+    assert [(f.index, f.field) for f in failures] == [
+        (1, "x"), (1, "y"), (3, "y")]
+
+
+def test_load_many_collect_lazy_model():
+
+    ''' lazy models are loaded eagerly when collecting failures '''
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Integer)
+        name = Field(typedef=Upper)
+
+        class Meta:
+            lazy = True
+
+    engine = bound_engine(Model)
+    wires = [{"x": "1", "name": "a"}, {"x": "bad"}, {"name": "b"}]
+    failures = []
+    loaded = engine.load_many(Model, wires, errors="collect",
+                              failures=failures)
+    assert [obj.name for obj in loaded] == ["A", "B"]
+    # Already loaded, not waiting for the first read
+    assert loaded[0].__dict__["x"] == 1
+    assert [(f.index, f.field) for f in failures] == [(1, "x")]
+
+    loaded = list(engine.iter_load(Model, wires, errors="drop"))
+    assert [obj.name for obj in loaded] == ["A", "B"]
+    # Raising mode stays lazy
+    obj, = engine.load_many(Model, wires[1:2])
+    with pytest.raises(ValueError):
+        obj.x
+
+
+def test_column_batch_collect():
+
+    ''' failed cells are left unset and the rest of the batch is kept '''
+    pytest.importorskip("numpy")
+
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Integer)
+        y = Field(typedef=Integer)
+
+    engine = bound_engine(Model)
+    wires = [{"x": "1", "y": "bad"}, {"y": "2"}, {"x": "bad", "y": "3"}]
+    failures = []
+    batch = ColumnBatch.load(Model, wires, engine, errors="collect",
+                             failures=failures)
+    assert [(f.index, f.field, f.value) for f in failures] == [
+        (2, "x", "bad"), (0, "y", "bad")]
+    assert batch.present["x"].tolist() == [True, False, False]
+    assert batch.present["y"].tolist() == [False, True, True]
+    assert batch.columns["y"][1:].tolist() == [2, 3]
+    with pytest.raises(ValueError):
+        ColumnBatch.load(Model, wires, engine, errors="collect")
+
+
+def test_from_rows_to_rows():
+
+    ''' rows map positionally onto Meta.fields; None means unset '''
+
+    class Model(metaclass=ModelMetaclass):
+        name = Field(typedef=Upper)
+        age = Field(typedef=Integer)
+        extra = Field()
+
+    engine = bound_engine(Model)
+    rows = [("alice", "30", 1), ("bob", None, None)]
+    loaded = Model.from_rows(iter(rows), engine=engine)
+    assert not isinstance(loaded, list)
+    first, second = loaded
+    assert (first.name, first.age, first.extra) == ("ALICE", 30, 1)
+    assert second.name == "BOB"
+    assert not hasattr(second, "age")
+    assert list(Model.to_rows([first, second], engine=engine)) == [
+        ("alice", "30", 1), ("bob", None, None)]
+
+    with pytest.raises(ValueError):
+        next(Model.from_rows([("too", "short")], engine=engine))
+
+
+def test_rows_optional_none():
+
+    ''' None round-trips through rows for Optional fields '''
+
+    class Model(metaclass=ModelMetaclass):
+        name = Field(typedef=Upper)
+        age = Field(typedef=Optional(Integer))
+
+    engine = bound_engine(Model)
+    obj, = Model.from_rows([("alice", None)], engine=engine)
+    assert obj.age is None
+    assert list(Model.to_rows([obj], engine=engine)) == [("alice", None)]
+    obj, = Model.from_rows([(None, "3")], engine=engine)
+    assert not hasattr(obj, "name") and obj.age == 3
+
+
+def test_rows_slots_and_tracked_set():
+
+    ''' slotted models and overridden set methods still load from rows '''
+
+    class Tracked(Field):
+        def set(self, obj, value):
+            super().set(obj, value)
+
+    class Model(metaclass=ModelMetaclass):
+        class Meta:
+            slots = True
+            track_changes = True
+        x = Tracked(typedef=Integer)
+        y = Field(typedef=Integer)
+
+    engine = bound_engine(Model)
+    obj, = Model.from_rows([("1", "2")], engine=engine)
+    assert (obj.x, obj.y) == (1, 2)
+    assert not changes(obj)
+    assert list(Model.to_rows([obj], engine=engine)) == [("1", "2")]
+
+
+def test_rows_lazy_model():
+
+    ''' lazy models load row values eagerly '''
+
+    class Model(metaclass=ModelMetaclass):
+        class Meta:
+            lazy = True
+        x = Field(typedef=Integer)
+
+    engine = bound_engine(Model)
+    obj, = Model.from_rows([("4",)], engine=engine)
+    assert obj.x == 4
+    assert list(Model.to_rows([obj], engine=engine)) == [("4",)]
+
+
+def test_rows_unbound_and_rebind():
+
+    ''' unbound models raise; rebinding regenerates the row functions '''
+
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Upper)
+
+    engine = TypeEngine.unique()
+    with pytest.raises(DeclareException):
+        Model.from_rows([], engine=engine)
+    engine.register(Model)
+    engine.bind()
+    before = Model._row_functions(engine)
+    assert Model._row_functions(engine) is before
+    engine.register(Integer())
+    engine.bind()
+    assert Model._row_functions(engine) is not before
+    assert [obj.x for obj in Model.from_rows([("a",)], engine=engine)] == [
+        "A"]
+
+
+def test_model_async_field():
+
+    ''' generated model code can't await, so async fields can't bind '''
+
+    class Lookup(TypeDefinition):
+        def bind(self, engine, **config):
+            async def load(value, **kwargs):
+                return value
+            return load, self._dump
+
+    class Model(metaclass=ModelMetaclass):
+        x = Field(typedef=Lookup)
+
+    engine = TypeEngine.unique()
+    engine.register(Model)
+    with pytest.raises(DeclareException):
+        engine.bind()
+    assert Model not in engine.bound_types
+
+
+def test_model_option_field_names():
+
+    ''' fields named after typedef bind options don't shadow them '''
+
+    class Model(metaclass=ModelMetaclass):
+        memoize = Field(typedef=Integer)
+        validators = Field(typedef=Integer)
+        intern = Field(typedef=Integer)
+
+    engine = bound_engine(Model)
+    obj = engine.load(Model, {"memoize": "1", "validators": "2",
+                              "intern": "3"})
+    assert (obj.memoize, obj.validators, obj.intern) == (1, 2, 3)
+    assert engine.cache_info(Model) == {}
+    assert engine.intern_info(Model) is None
@@ -1,10 +1,25 @@
+import asyncio
 import base64
 import collections
+import concurrent.futures
+import multiprocessing
+import sys
+import threading
+import time
 import pytest
-from declare import (TypeEngine, TypeDefinition,
+from declare import (TypeEngine, TypeDefinition, List, Map, Optional,
                      TypeEngineMeta, DeclareException)
 
 
+class Base64Bytes(TypeDefinition):
+    ''' Module-level (picklable) version of Base64BytesTypeDef '''
+    def _load(self, value, **kwargs):
+        return base64.b64decode(value.encode("UTF-8"))
+
+    def _dump(self, value, **kwargs):
+        return base64.b64encode(value).decode("UTF-8")
+
+
 @pytest.fixture(autouse=True)
 def clear_engines(request):
 
@@ -161,6 +176,76 @@ def test_global_engine_fixed():
     assert "global" in TypeEngineMeta.engines
 
 
+def test_concurrent_engine_creation():
+
+    ''' Racing threads all get the same, fully init'd engine '''
+    threads = 32
+    barrier = threading.Barrier(threads)
+    init_calls = []
+
+    class SlowEngine(TypeEngine):
+        def __init__(self, namespace, *args, **kwargs):
+            init_calls.append(namespace)
+            # Widen the window between creating and publishing the engine
+            time.sleep(0.01)
+            super().__init__(namespace, *args, **kwargs)
+            self.ready = True
+
+    def create(_):
+        barrier.wait()
+        return SlowEngine("contended")
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        engines = list(executor.map(create, range(threads)))
+
+    assert init_calls == ["contended"]
+    assert all(engine is engines[0] for engine in engines)
+    assert all(engine.ready for engine in engines)
+
+
+def test_failed_engine_init_not_published():
+
+    ''' An engine whose __init__ raises isn't kept for the namespace '''
+    class FailingEngine(TypeEngine):
+        attempts = 0
+
+        def __init__(self, namespace, *args, **kwargs):
+            FailingEngine.attempts += 1
+            if FailingEngine.attempts == 1:
+                raise ValueError("first init fails")
+            super().__init__(namespace, *args, **kwargs)
+
+    with pytest.raises(ValueError):
+        FailingEngine("flaky")
+    assert "flaky" not in TypeEngineMeta.engines
+    assert FailingEngine("flaky").namespace == "flaky"
+
+
+def test_concurrent_register_and_bind():
+
+    ''' Registering and binding from many threads loses no typedefs '''
+    engine = TypeEngine("contended")
+    threads, per_thread = 16, 50
+    barrier = threading.Barrier(threads)
+
+    def register_and_bind(_):
+        typedefs = [TypeDefinition() for _ in range(per_thread)]
+        barrier.wait()
+        for typedef in typedefs:
+            engine.register(typedef)
+            engine.bind()
+        return typedefs
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(register_and_bind, range(threads)))
+
+    typedefs = [typedef for result in results for typedef in result]
+    assert not engine.unbound_types
+    assert all(typedef in engine.bound_types for typedef in typedefs)
+    assert len(engine._registered) == threads * per_thread
+    assert engine.generation == threads * per_thread
+
+
 def test_register_incompatibile_typedef(NumericEngine, Base64BytesTypeDef):
 
     ''' register should fail if the typedef is incompatibile '''
@@ -377,3 +462,1047 @@ def test_context_passed(ContextType, engine_for):
 
     assert context["load"] == 1
     assert context["dump"] == 1
+
+
+def test_many_falls_back_to_per_item(NumericStringTypeDef, engine_for):
+
+    ''' typedefs without batch hooks convert each value in a loop '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+
+    assert engine.load_many(typedef, iter([1, 2, 3])) == ["1", "2", "3"]
+    assert engine.dump_many(typedef, ("1", "2", "3")) == [1, 2, 3]
+    assert engine.load_many(typedef, []) == []
+
+
+def test_many_uses_batch_hooks(engine_for):
+
+    ''' batch hooks from bind_many are used when available '''
+
+    class Batched(TypeDefinition):
+        calls = collections.defaultdict(int)
+
+        def _load_many(self, values, **kwargs):
+            self.calls["load_many"] += 1
+            return tuple(v * 2 for v in values)
+
+        def bind_many(self, engine, **config):
+            self.calls["config"] = config
+            return super().bind_many(engine, **config)
+
+    typedef = Batched()
+    engine = TypeEngine.unique()
+    engine.register(typedef)
+    engine.bind(scale=2)
+
+    assert engine.load_many(typedef, [1, 2]) == (2, 4)
+    assert typedef.calls == {"load_many": 1, "config": {"scale": 2}}
+    # No dump_many hook, so fall back to the bound dump
+    assert engine.dump_many(typedef, [1, 2]) == [1, 2]
+
+
+def test_many_context_passed(ContextType, engine_for):
+
+    ''' context is passed to each per-item call '''
+
+    typedef = ContextType()
+    engine = engine_for(typedef)
+    context = {"load": 0, "dump": 0}
+    engine.load_many(typedef, ["a", "b"], context=context)
+    engine.dump_many(typedef, ["a", "b", "c"], context=context)
+
+    assert context == {"load": 2, "dump": 3}
+
+
+def test_many_unbound_typedef(SimpleTypeDef):
+
+    ''' load_many and dump_many raise for unbound typedefs '''
+    engine = TypeEngine.unique()
+    typedef = SimpleTypeDef()
+
+    with pytest.raises(DeclareException):
+        engine.load_many(typedef, ["foo"])
+    with pytest.raises(DeclareException):
+        engine.dump_many(typedef, ["foo"])
+
+
+def test_iter_load_lazy(NumericStringTypeDef, engine_for):
+
+    ''' iter_load consumes the input lazily '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+    consumed = []
+
+    def values():
+        for i in range(5):
+            consumed.append(i)
+            yield i
+
+    stream = engine.iter_load(typedef, values())
+    assert next(stream) == "0"
+    assert consumed == [0]
+    assert list(stream) == ["1", "2", "3", "4"]
+
+
+def test_iter_load_chunks(NumericStringTypeDef, engine_for):
+
+    ''' chunk_size yields lists of loaded values '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+
+    chunks = engine.iter_load(typedef, range(5), chunk_size=2)
+    assert list(chunks) == [["0", "1"], ["2", "3"], ["4"]]
+    assert list(engine.iter_dump(typedef, "123", chunk_size=5)) == [[1, 2, 3]]
+
+
+def test_iter_errors(NumericStringTypeDef, engine_for):
+
+    ''' failing values can raise, be dropped, or be collected '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+    values = ["1", "x", "3", "y"]
+
+    with pytest.raises(ValueError):
+        list(engine.iter_dump(typedef, values))
+    assert list(engine.iter_dump(typedef, values, errors="drop")) == [1, 3]
+
+    failures = []
+    chunks = engine.iter_dump(typedef, values, chunk_size=3,
+                              errors="collect", failures=failures)
+    assert list(chunks) == [[1, 3]]
+    assert [(f.index, f.value) for f in failures] == [(1, "x"), (3, "y")]
+    assert all(isinstance(f.exception, ValueError) for f in failures)
+
+
+def test_iter_invalid_arguments(NumericStringTypeDef, engine_for):
+
+    ''' bad arguments and unbound typedefs fail before the stream starts '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+
+    with pytest.raises(ValueError):
+        engine.iter_load(typedef, [], errors="ignore")
+    with pytest.raises(ValueError):
+        engine.iter_load(typedef, [], errors="collect")
+    with pytest.raises(ValueError):
+        engine.iter_load(typedef, [], chunk_size=0)
+    with pytest.raises(DeclareException):
+        engine.iter_load(TypeDefinition(), [])
+    with pytest.raises(DeclareException):
+        engine.iter_dump(TypeDefinition(), [])
+
+
+@pytest.fixture()
+def AsyncTypeDef():
+    class TestTypeDef(TypeDefinition):
+        ''' Loads by awaiting a fake lookup, dumps synchronously '''
+        def __init__(self):
+            self.active = self.peak = 0
+
+        def bind(self, engine, **config):
+            async def load(value, **kwargs):
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                await asyncio.sleep(0.001 * (value % 3))
+                self.active -= 1
+                if value < 0:
+                    raise ValueError(value)
+                return value * 10
+            return load, self._dump
+    return TestTypeDef
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_aload_adump(AsyncTypeDef, engine_for):
+
+    ''' coroutine functions are awaited, sync functions are called '''
+
+    typedef = AsyncTypeDef()
+    engine = engine_for(typedef)
+
+    assert run(engine.aload(typedef, 2)) == 20
+    assert run(engine.adump(typedef, 2)) == 2
+    with pytest.raises(DeclareException):
+        run(engine.aload(TypeDefinition(), 2))
+    with pytest.raises(DeclareException):
+        run(engine.adump(TypeDefinition(), 2))
+
+
+def test_aload_many_concurrency(AsyncTypeDef, engine_for):
+
+    ''' batch loads run concurrently up to the limit, in input order '''
+
+    typedef = AsyncTypeDef()
+    engine = engine_for(typedef)
+    values = list(range(10))
+
+    result = run(engine.aload_many(typedef, values, concurrency=3))
+    assert result == [v * 10 for v in values]
+    assert typedef.peak == 3
+
+    typedef.peak = 0
+    run(engine.aload_many(typedef, values))
+    assert typedef.peak == 10
+    assert run(engine.aload_many(typedef, [])) == []
+
+    with pytest.raises(ValueError):
+        run(engine.aload_many(typedef, [1, -1, 2], concurrency=2))
+    with pytest.raises(ValueError):
+        run(engine.aload_many(typedef, values, concurrency=0))
+
+
+def test_async_many_sync_typedef(NumericStringTypeDef, engine_for):
+
+    ''' sync typedefs use the bound batch functions directly '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+
+    assert run(engine.aload_many(typedef, [1, 2])) == ["1", "2"]
+    assert run(engine.adump_many(typedef, ["1", "2"])) == [1, 2]
+    with pytest.raises(DeclareException):
+        run(engine.aload_many(TypeDefinition(), [1]))
+    with pytest.raises(DeclareException):
+        run(engine.adump_many(TypeDefinition(), [1]))
+
+
+def test_sync_many_async_typedef(AsyncTypeDef, engine_for):
+
+    ''' sync batch methods refuse coroutine functions they can't await '''
+
+    typedef = AsyncTypeDef()
+    engine = engine_for(typedef)
+
+    with pytest.raises(DeclareException):
+        engine.load_many(typedef, [1])
+    with pytest.raises(DeclareException):
+        engine.iter_load(typedef, [1])
+    with pytest.raises(DeclareException):
+        engine.load_many_parallel(typedef, [1])
+    # Only load is a coroutine function
+    assert engine.dump_many(typedef, [1]) == [1]
+    assert list(engine.iter_dump(typedef, [1])) == [1]
+
+
+def test_bind_parallel(NumericStringTypeDef, Base64BytesTypeDef):
+
+    ''' parallel bind binds every typedef in registration order '''
+
+    engine = TypeEngine.unique()
+    typedefs = [NumericStringTypeDef() for _ in range(10)]
+    typedefs.append(Base64BytesTypeDef())
+    for typedef in typedefs:
+        engine.register(typedef)
+
+    timings = engine.bind_parallel(max_workers=4)
+    assert not engine.unbound_types
+    assert list(engine.bound_types) == typedefs
+    assert list(timings) == typedefs
+    assert all(seconds >= 0 for seconds in timings.values())
+    assert engine.load(typedefs[0], 3) == "3"
+    assert engine.bind_parallel() == {}
+
+
+def test_bind_parallel_handles_exceptions(
+        TypeDefRaisesOnBind, NumericStringTypeDef):
+
+    ''' typedefs that fail to bind return to unbound_types '''
+
+    failing = TypeDefRaisesOnBind()
+    ok = NumericStringTypeDef()
+    engine = TypeEngine.unique()
+    engine.register(failing)
+    engine.register(ok)
+
+    with pytest.raises(ValueError):
+        engine.bind_parallel()
+    assert engine.unbound_types == {failing}
+    assert ok in engine
+
+
+def test_bind_parallel_config_and_executor():
+
+    ''' config is passed to each typedef, and executors can be shared '''
+
+    class Configured(TypeDefinition):
+        def bind(self, engine, **config):
+            self.config = config
+            return super().bind(engine, **config)
+
+    typedefs = [Configured(), Configured()]
+    engine = TypeEngine.unique()
+    for typedef in typedefs:
+        engine.register(typedef)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        engine.bind_parallel(executor=executor, precision=3)
+    assert all(t.config == {"precision": 3} for t in typedefs)
+
+
+def test_bind_parallel_reentrant_bind(IntTypeDef):
+
+    ''' a typedef's bind can register and bind through the engine '''
+
+    child = IntTypeDef()
+
+    class Parent(TypeDefinition):
+        def bind(self, engine, **config):
+            engine.register(child)
+            engine.bind(**config)
+            return engine.bound_types[child].load, str
+
+    parent = Parent()
+    engine = TypeEngine.unique()
+    engine.register(parent)
+    worker = threading.Thread(target=engine.bind_parallel, daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    assert parent in engine and child in engine
+    assert engine.load(parent, "3") == 3
+
+
+def test_parallel_many_in_process_pool():
+
+    ''' chunks are converted in worker processes, in input order '''
+
+    typedef = Base64Bytes()
+    engine = TypeEngine.unique()
+    engine.register(typedef)
+    engine.bind()
+    values = [str(i).encode("UTF-8") for i in range(25)]
+
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        dumped = engine.dump_many_parallel(
+            typedef, values, chunk_size=4, executor=executor)
+        assert dumped == engine.dump_many(typedef, values)
+        loaded = engine.load_many_parallel(
+            typedef, iter(dumped), chunk_size=7, executor=executor)
+    assert loaded == values
+
+
+def test_parallel_many_frozen_engine():
+
+    ''' workers forked from a frozen engine bind into a private engine '''
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs the fork start method")
+    typedef = Base64Bytes()
+    engine = TypeEngine.unique()
+    engine.register(typedef)
+    engine.bind()
+    engine.freeze()
+    values = [str(i).encode("UTF-8") for i in range(10)]
+
+    options = {}
+    if sys.version_info >= (3, 7):
+        options["mp_context"] = multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(2, **options) as executor:
+        dumped = engine.dump_many_parallel(
+            typedef, values, chunk_size=3, executor=executor)
+        assert dumped == engine.dump_many(typedef, values)
+        loaded = engine.load_many_parallel(
+            typedef, dumped, chunk_size=3, executor=executor)
+    assert loaded == values
+
+
+def test_parallel_many_thread_executor(NumericStringTypeDef):
+
+    ''' thread workers never register or bind on the caller's engine '''
+
+    typedef, pending = Base64Bytes(), NumericStringTypeDef()
+    engine = TypeEngine.unique()
+    engine.register(typedef)
+    engine.bind()
+    engine.register(pending)
+    values = [b"a", b"b", b"c"]
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        dumped = engine.dump_many_parallel(
+            typedef, values, chunk_size=2, executor=executor)
+    assert dumped == engine.dump_many(typedef, values)
+    assert list(engine.bound_types) == [typedef]
+    assert engine.unbound_types == {pending}
+
+
+def test_parallel_many_default_executor(NumericStringTypeDef, engine_for):
+
+    ''' default pool, plus unbound typedefs and bad chunk sizes raising '''
+
+    typedef = Base64Bytes()
+    engine = engine_for(typedef)
+    assert engine.load_many_parallel(typedef, [], max_workers=1) == []
+
+    with pytest.raises(DeclareException):
+        engine.dump_many_parallel(NumericStringTypeDef(), [1])
+    with pytest.raises(ValueError):
+        engine.load_many_parallel(typedef, [""], chunk_size=0)
+
+
+def test_dump_value_by_python_type(
+        NumericStringTypeDef, Base64BytesTypeDef, engine_for):
+
+    ''' dump_value finds the typedef from the value's class '''
+
+    engine = engine_for(NumericStringTypeDef(), Base64BytesTypeDef())
+    assert engine.dump_value("12") == 12
+    assert engine.dump_value(b"Hello") == "SGVsbG8="
+
+    with pytest.raises(DeclareException):
+        engine.dump_value(1.5)
+
+
+def test_load_value(NumericStringTypeDef, Base64BytesTypeDef, engine_for):
+
+    ''' load_value finds the typedef by python_type or backing_type '''
+
+    engine = engine_for(NumericStringTypeDef(), Base64BytesTypeDef())
+    assert engine.load_value(12, python_type=str) == "12"
+    assert engine.load_value("SGVsbG8=", python_type=bytes) == b"Hello"
+    # Without python_type, use the value's class as the backing type
+    assert engine.load_value(12) == "12"
+    assert engine.load_value("SGVsbG8=") == b"Hello"
+
+    with pytest.raises(DeclareException):
+        engine.load_value(1, python_type=float)
+    with pytest.raises(DeclareException):
+        engine.load_value(1.5)
+
+
+def test_resolve_walks_mro_and_caches():
+
+    ''' subclasses use the typedef of the nearest indexed base class '''
+
+    class Base:
+        pass
+
+    class Derived(Base):
+        pass
+
+    class BaseType(TypeDefinition):
+        python_type = Base
+
+        def _dump(self, value, **kwargs):
+            return "base"
+
+    class DerivedType(TypeDefinition):
+        python_type = Derived
+
+        def _dump(self, value, **kwargs):
+            return "derived"
+
+    engine = TypeEngine.unique()
+    engine.register(BaseType())
+    engine.bind()
+    assert engine.dump_value(Derived()) == "base"
+    assert Derived in engine._python_type_cache
+
+    # Binding another typedef invalidates the cache
+    engine.register(DerivedType())
+    engine.bind()
+    assert engine.dump_value(Derived()) == "derived"
+    assert engine.dump_value(Base()) == "base"
+
+
+def test_resolve_first_registered_wins():
+
+    ''' typedefs sharing a python_type resolve to the first registered '''
+
+    class First(TypeDefinition):
+        python_type = str
+
+        def _dump(self, value, **kwargs):
+            return "first"
+
+    class Second(First):
+        def _dump(self, value, **kwargs):
+            return "second"
+
+    for _ in range(5):
+        engine = TypeEngine.unique()
+        engine.register(First())
+        engine.register(Second())
+        engine.bind()
+        assert engine.dump_value("x") == "first"
+
+
+@pytest.fixture()
+def CountingTypeDef():
+    class TestTypeDef(TypeDefinition):
+        ''' Counts calls to the underlying load '''
+        def __init__(self, memoize=None):
+            self.memoize = memoize
+            self.loads = 0
+
+        def _load(self, value, **kwargs):
+            self.loads += 1
+            return str(value)
+    return TestTypeDef
+
+
+def test_memoize_per_typedef(CountingTypeDef, engine_for):
+
+    ''' memoized typedefs reuse results and report counters '''
+
+    typedef = CountingTypeDef(memoize={"maxsize": 2})
+    engine = engine_for(typedef)
+
+    for value in [1, 2, 1, 1, 3, 2]:
+        assert engine.load(typedef, value) == str(value)
+    assert typedef.loads == 4
+    info = engine.cache_info(typedef)["load"]
+    assert (info.hits, info.misses, info.evictions) == (2, 4, 2)
+    assert (info.size, info.maxsize) == (2, 2)
+    assert engine.cache_info(typedef)["dump"].misses == 0
+
+
+def test_memoize_fifo_policy(CountingTypeDef, engine_for):
+
+    ''' fifo evicts the oldest entry even if it was just used '''
+
+    typedef = CountingTypeDef(memoize={"maxsize": 2, "policy": "fifo"})
+    engine = engine_for(typedef)
+    for value in [1, 2, 1, 3, 1]:
+        engine.load(typedef, value)
+    assert typedef.loads == 4
+
+    with pytest.raises(ValueError):
+        engine_for(CountingTypeDef(memoize={"policy": "random"}))
+
+
+def test_memoize_ttl(CountingTypeDef, engine_for, monkeypatch):
+
+    ''' entries older than ttl are reloaded '''
+
+    import declare
+    now = [100.0]
+    monkeypatch.setattr(declare.time, "monotonic", lambda: now[0])
+    typedef = CountingTypeDef(memoize={"ttl": 10})
+    engine = engine_for(typedef)
+
+    engine.load(typedef, 1)
+    now[0] += 5
+    engine.load(typedef, 1)
+    assert typedef.loads == 1
+    now[0] += 10
+    engine.load(typedef, 1)
+    assert typedef.loads == 2
+    assert engine.cache_info(typedef)["load"].evictions == 1
+
+
+def test_memoize_unhashable_bypass(CountingTypeDef, engine_for):
+
+    ''' unhashable values and contexts are never cached '''
+
+    typedef = CountingTypeDef(memoize=True)
+    engine = engine_for(typedef)
+
+    engine.load(typedef, [1])
+    engine.load(typedef, [1])
+    engine.load(typedef, 1, context={})
+    engine.load(typedef, 1, flag=True)
+    engine.load(typedef, 1, flag=True)
+    assert typedef.loads == 4
+    assert engine.cache_info(typedef)["load"].bypassed == 3
+
+
+def test_memoize_typed_keys(CountingTypeDef, engine_for):
+
+    ''' equal values of different types and contexts never share results '''
+
+    typedef = CountingTypeDef(memoize=True)
+    engine = engine_for(typedef)
+
+    assert [engine.load(typedef, v) for v in (1, True, 1.0)] == [
+        "1", "True", "1.0"]
+    assert engine.load(typedef, 1, flag=True) == "1"
+    value = (1, (("flag", True),))
+    assert engine.load(typedef, value) == str(value)
+    assert typedef.loads == 5
+
+
+def test_memoize_bind_config(CountingTypeDef):
+
+    ''' the bind config enables memoizing for typedefs that don't opt out '''
+
+    default, opted_out = CountingTypeDef(), CountingTypeDef(memoize=False)
+    engine = TypeEngine.unique()
+    engine.register(default)
+    engine.register(opted_out)
+    engine.bind(memoize={"maxsize": None})
+
+    for _ in range(3):
+        engine.load(default, 1)
+        engine.load(opted_out, 1)
+    assert (default.loads, opted_out.loads) == (1, 3)
+    assert engine.cache_info(default)["load"].maxsize is None
+    assert engine.cache_info(opted_out) == {}
+    with pytest.raises(DeclareException):
+        engine.cache_info(TypeDefinition())
+
+
+def test_metrics_record_calls(NumericStringTypeDef, engine_for):
+
+    ''' enabled metrics count calls, errors and latency per operation '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+    assert engine.metrics() == {}
+
+    engine.enable_metrics()
+    engine.load(typedef, 1)
+    engine.load(typedef, 2)
+    engine.dump_many(typedef, ["1", "2"])
+    with pytest.raises(ValueError):
+        engine.dump(typedef, "x")
+
+    metrics = engine.metrics()[typedef]
+    assert set(metrics) == {"load", "dump", "dump_many"}
+    assert (metrics["load"].calls, metrics["load"].errors) == (2, 0)
+    assert (metrics["dump"].calls, metrics["dump"].errors) == (1, 1)
+    load = metrics["load"]
+    assert load.total >= load.p99 >= load.p90 >= load.p50 > 0
+
+    engine.reset_metrics()
+    assert engine.metrics() == {}
+
+
+def test_metrics_disable_restores_functions(NumericStringTypeDef, engine_for):
+
+    ''' disabling metrics puts back the original bound functions '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+    original = engine.bound_types[typedef]
+
+    engine.enable_metrics()
+    engine.enable_metrics()
+    assert engine.bound_types[typedef]["load"] is not original["load"]
+    engine.disable_metrics()
+    engine.disable_metrics()
+    assert engine.bound_types[typedef] is original
+    assert engine.load(typedef, 1) == "1"
+    assert engine.metrics() == {}
+
+
+def test_metrics_bind(NumericStringTypeDef, TypeDefRaisesOnBind):
+
+    ''' binds while metrics are enabled are timed and instrumented '''
+
+    engine = TypeEngine.unique()
+    engine.enable_metrics()
+    typedef, failing = NumericStringTypeDef(), TypeDefRaisesOnBind()
+    engine.register(typedef)
+    engine.bind()
+    engine.register(failing)
+    with pytest.raises(ValueError):
+        engine.bind()
+    engine.load(typedef, 1)
+
+    metrics = engine.metrics()
+    assert metrics[typedef]["bind"].calls == 1
+    assert metrics[typedef]["load"].calls == 1
+    assert metrics[failing]["bind"].errors == 1
+
+
+def test_metrics_async_and_memoized(AsyncTypeDef, engine_for):
+
+    ''' wrappers keep coroutine functions awaitable and caches visible '''
+
+    typedef = AsyncTypeDef()
+    typedef.memoize = True
+    engine = engine_for(typedef)
+    engine.enable_metrics()
+
+    assert run(engine.aload(typedef, 2)) == 20
+    assert run(engine.adump(typedef, 2)) == 2
+    assert engine.metrics()[typedef]["load"].calls == 1
+    assert engine.cache_info(typedef)["dump"].misses == 1
+
+
+def test_bound_types_are_compact_records(NumericStringTypeDef, engine_for):
+
+    ''' bound types are tuples, also readable by field name '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+    bound_type = engine.bound_types[typedef]
+
+    assert isinstance(bound_type, tuple)
+    assert bound_type["load"] is bound_type.load is bound_type[0]
+    assert bound_type.async_load is False
+    with pytest.raises(KeyError):
+        bound_type["missing"]
+
+
+def test_handle(NumericStringTypeDef, engine_for):
+
+    ''' handles expose the bound functions directly '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+    handle = engine.handle(typedef)
+
+    assert engine.handle(typedef) is handle
+    assert handle.load is engine.bound_types[typedef].load
+    assert handle.load(1) == "1"
+    assert handle.dump_many(["1", "2"]) == [1, 2]
+    assert handle.generation == engine.generation
+
+    with pytest.raises(DeclareException):
+        engine.handle(TypeDefinition())
+
+
+def test_handle_refreshed_on_change(NumericStringTypeDef, engine_for):
+
+    ''' handles pick up new bound functions without being re-fetched '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+    handle = engine.handle(typedef)
+    original = handle.load
+
+    engine.enable_metrics()
+    assert handle.load is engine.bound_types[typedef].load
+    assert handle.load is not original
+    handle.load(1)
+    assert engine.metrics()[typedef]["load"].calls == 1
+
+    engine.disable_metrics()
+    assert handle.load is original
+    assert handle.generation == engine.generation
+
+    # Removed typedefs can't be refreshed
+    del engine.bound_types[typedef]
+    with pytest.raises(DeclareException):
+        handle.refresh()
+
+
+def test_freeze(NumericStringTypeDef, SimpleTypeDef, engine_for):
+
+    ''' frozen engines convert values but reject changes '''
+
+    typedef = NumericStringTypeDef()
+    engine = engine_for(typedef)
+    assert engine.freeze() is engine
+    assert engine.freeze() is engine
+
+    assert engine.load(typedef, 1) == "1"
+    assert engine.dump_value("2") == 2
+    assert engine.handle(typedef).load(3) == "3"
+    assert typedef in engine
+    with pytest.raises(TypeError):
+        engine.bound_types[typedef] = None
+
+    # Already bound, so nothing to do
+    engine.register(typedef)
+    for change in (lambda: engine.register(SimpleTypeDef()),
+                   engine.bind, engine.bind_parallel,
+                   engine.enable_metrics, engine.disable_metrics):
+        with pytest.raises(DeclareException):
+            change()
+
+
+def test_freeze_requires_bound_types(SimpleTypeDef):
+
+    ''' typedefs must be bound before the engine can be frozen '''
+
+    engine = TypeEngine.unique()
+    engine.register(SimpleTypeDef())
+    with pytest.raises(DeclareException):
+        engine.freeze()
+    engine.bind()
+    engine.freeze()
+
+
+def test_frozen_concurrent_reads(NumericStringTypeDef, engine_for):
+
+    ''' many threads can share a frozen engine, including memoized types '''
+
+    typedef = NumericStringTypeDef()
+    typedef.memoize = {"maxsize": 8}
+    engine = engine_for(typedef).freeze()
+
+    def work(offset):
+        return [engine.load(typedef, (offset + i) % 20) for i in range(2000)]
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(work, range(16)))
+    for offset, result in enumerate(results):
+        assert result == [str((offset + i) % 20) for i in range(2000)]
+
+
+def test_composite_typedefs(NumericStringTypeDef, engine_for):
+
+    ''' List, Map and Optional convert with their child typedefs '''
+
+    numbers = List(Optional(NumericStringTypeDef))
+    by_name = Map(NumericStringTypeDef, key=Base64Bytes)
+    engine = engine_for(numbers, by_name)
+    assert not engine.unbound_types
+
+    assert engine.load(numbers, [1, None, 3]) == ["1", None, "3"]
+    assert engine.dump(numbers, ["1", None]) == [1, None]
+    assert engine.load(by_name, {"YQ==": 1}) == {b"a": "1"}
+    assert engine.dump(by_name, {b"a": "1"}) == {"YQ==": 1}
+    assert Map(NumericStringTypeDef).python_type is dict
+    assert Optional(NumericStringTypeDef).backing_type is None
+
+
+def test_optional_not_indexed(NumericStringTypeDef):
+
+    ''' Optional doesn't compete with its typedef in value lookups '''
+
+    typedef = NumericStringTypeDef()
+    engine = TypeEngine.unique()
+    engine.register(typedef)
+    engine.register(Optional(typedef))
+    engine.bind()
+    assert engine._by_python_type[str] is typedef
+    assert engine._by_backing_type[int] is typedef
+    assert engine.dump_value("3") == 3
+
+
+def test_composite_resolves_children_once(NumericStringTypeDef, engine_for):
+
+    ''' converting values doesn't look up the child in bound_types '''
+
+    child = NumericStringTypeDef()
+    numbers = List(child)
+    engine = engine_for(numbers)
+    assert child in engine.bound_types
+
+    class Lookups(dict):
+        gets = 0
+
+        def __getitem__(self, key):
+            Lookups.gets += 1
+            return super().__getitem__(key)
+
+        def get(self, key, default=None):
+            Lookups.gets += 1
+            return super().get(key, default)
+    engine.bound_types = Lookups(engine.bound_types)
+    assert engine.load(numbers, list(range(100))) == [
+        str(i) for i in range(100)]
+    assert Lookups.gets == 1
+
+
+def test_composite_invalid_child():
+
+    ''' children must be typedefs, or functions returning one '''
+
+    with pytest.raises(TypeError):
+        List(object())
+    deferred = List(lambda: object())
+    with pytest.raises(TypeError):
+        deferred.children
+
+
+@pytest.fixture()
+def IntTypeDef():
+    class TestTypeDef(TypeDefinition):
+        ''' Parses ints, counting each call to load '''
+        def __init__(self, validators=()):
+            self.validators = validators
+            self.loads = 0
+
+        def _load(self, value, **kwargs):
+            self.loads += 1
+            return int(value)
+    return TestTypeDef
+
+
+def test_load_many_collect(IntTypeDef, engine_for):
+
+    ''' failed values are collected and the rest are loaded, once each '''
+
+    typedef = IntTypeDef()
+    engine = engine_for(typedef)
+    failures = []
+    loaded = engine.load_many(typedef, ["1", "x", "3", "y"],
+                              errors="collect", failures=failures)
+    assert loaded == [1, 3]
+    assert [(f.index, f.value, f.field) for f in failures] == [
+        (1, "x", None), (3, "y", None)]
+    assert typedef.loads == 4
+
+    assert engine.load_many(typedef, ["x", "2"], errors="drop") == [2]
+    with pytest.raises(ValueError):
+        engine.load_many(typedef, ["1"], errors="collect")
+    with pytest.raises(ValueError):
+        engine.load_many(typedef, ["x"])
+
+
+def test_load_many_collect_with_metrics(IntTypeDef, engine_for):
+
+    ''' metrics wrappers don't hide that there is no batch hook '''
+
+    typedef = IntTypeDef()
+    engine = engine_for(typedef)
+    assert engine.bound_types[typedef].load_many is None
+    engine.enable_metrics()
+    failures = []
+    chunks = list(engine.iter_load(typedef, ["1", "x", "3"], chunk_size=3,
+                                   errors="collect", failures=failures))
+    assert chunks == [[1, 3]]
+    assert typedef.loads == 3
+
+
+def test_load_many_collect_batch_hook(engine_for):
+
+    ''' batch hooks are tried first, then retried per value on failure '''
+
+    class Batched(TypeDefinition):
+        batches = 0
+
+        def _load(self, value, **kwargs):
+            return int(value)
+
+        def _load_many(self, values, **kwargs):
+            Batched.batches += 1
+            return [int(value) for value in values]
+
+    typedef = Batched()
+    engine = engine_for(typedef)
+    assert engine.bound_types[typedef].load_many is not None
+    assert engine.bound_types[typedef].dump_many is None
+    failures = []
+    assert engine.load_many(typedef, ["1", "2"], errors="collect",
+                            failures=failures) == [1, 2]
+    assert engine.load_many(typedef, ["1", "x"], errors="collect",
+                            failures=failures) == [1]
+    assert Batched.batches == 2
+    assert [f.index for f in failures] == [1]
+
+
+def test_validators(IntTypeDef, engine_for):
+
+    ''' validators run before load, including in batch hooks '''
+
+    def positive(value):
+        if int(value) <= 0:
+            raise ValueError("not positive")
+
+    def short(value):
+        if len(value) > 2:
+            raise ValueError("too long")
+
+    one, two = IntTypeDef([positive]), IntTypeDef([positive, short])
+    engine = engine_for(one, two)
+    assert engine.load(one, "123") == 123
+    with pytest.raises(ValueError):
+        engine.load(one, "-1")
+    with pytest.raises(ValueError):
+        engine.load(two, "123")
+    assert one.loads == 1 and two.loads == 0
+
+    failures = []
+    assert engine.load_many(two, ["1", "0", "100"], errors="collect",
+                            failures=failures) == [1]
+    assert [str(f.exception) for f in failures] == [
+        "not positive", "too long"]
+
+    class Batched(IntTypeDef):
+        def _load_many(self, values, **kwargs):
+            return [int(value) for value in values]
+    batched = Batched([positive])
+    engine = engine_for(batched)
+    with pytest.raises(ValueError):
+        engine.load_many(batched, ["1", "-1"])
+
+
+def test_async_validators(engine_for):
+
+    ''' validators also run before coroutine load functions '''
+
+    def positive(value):
+        if value <= 0:
+            raise ValueError("not positive")
+
+    class AsyncInt(TypeDefinition):
+        validators = (positive,)
+
+        def bind(self, engine, **config):
+            async def load(value, **kwargs):
+                return value * 2
+            return load, self._dump
+
+    typedef = AsyncInt()
+    engine = engine_for(typedef)
+    assert run(engine.aload(typedef, 2)) == 4
+    with pytest.raises(ValueError):
+        run(engine.aload(typedef, -2))
+
+
+@pytest.fixture()
+def NameTypeDef():
+    class TestTypeDef(TypeDefinition):
+        ''' Loads a new (equal) string object on every call '''
+        def __init__(self, intern=None):
+            self.intern = intern
+
+        def _load(self, value, **kwargs):
+            return "".join(["block-", str(value)])
+    return TestTypeDef
+
+
+def test_intern_shares_loaded_values(NameTypeDef, engine_for):
+
+    ''' equal loaded values are replaced by the first one loaded '''
+
+    typedef = NameTypeDef(intern=True)
+    engine = engine_for(typedef)
+    first, second = engine.load(typedef, 1), engine.load(typedef, 1)
+    assert first == second == "block-1"
+    assert first is second
+    assert engine.load_many(typedef, [1, 2, 2])[0] is first
+
+    info = engine.intern_info(typedef)
+    assert (info.hits, info.distinct, info.rejected) == (3, 2, 0)
+    assert info.bytes_saved == 3 * sys.getsizeof(first)
+    assert info.maxsize == 1024
+
+
+def test_intern_table_bounded(NameTypeDef, engine_for):
+
+    ''' full tables stop adding values; unhashable values pass through '''
+
+    class Loose(TypeDefinition):
+        intern = {"maxsize": 3}
+
+        def _load(self, value, **kwargs):
+            return value
+
+    typedef = Loose()
+    engine = engine_for(typedef)
+    for value in (1, "a", "b", "c", [1]):
+        engine.load(typedef, value)
+    # 1, True and 1.0 are equal, but only values of the same type are shared
+    assert engine.load(typedef, True) is True
+    assert engine.load(typedef, 1.0) == 1.0
+    info = engine.intern_info(typedef)
+    assert (info.distinct, info.rejected, info.bypassed) == (3, 1, 1)
+
+    plain = NameTypeDef()
+    engine = engine_for(plain)
+    assert engine.intern_info(plain) is None
+    assert engine.load(plain, 1) is not engine.load(plain, 1)
+
+    # Interning can be turned on for every typedef in the bind config
+    engine = TypeEngine.unique()
+    engine.register(plain)
+    engine.bind(intern={"maxsize": 10})
+    assert engine.intern_info(plain).maxsize == 10
+    assert engine.load(plain, 1) is engine.load(plain, 1)